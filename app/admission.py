@@ -0,0 +1,235 @@
+"""
+Admission control for interactive queries. Each lane has an in-flight cap and
+a bounded FIFO wait queue; a request that finds the queue full, or waits longer
+than the queue timeout, is shed with AdmissionRejected (HTTP 429 with a
+Retry-After hint) instead of piling more work onto slow agents and the LLM.
+
+Lanes:
+- ``general``: greetings/date/time/abuse answered locally; never queued.
+- ``long``: queries routed to long-running agents (onboarding flows), capped
+  separately so they cannot take every slot from short queries.
+- ``default``: everything else.
+- ``batch``: /api/query/batch requests; one slot per batch, however many
+  queries it carries (the batch bounds its own fan-out).
+
+Background jobs take a slot in their query's lane while a worker runs them,
+and wait for one instead of being shed.
+
+The lane is picked from the query text before planning (general rules and
+keyword heuristics), so a long-agent query only the LLM would route runs in
+the default lane. State is per-process and per event loop, like the job queue.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from . import metrics
+from .general import match_general_rule
+from .planner import heuristic_plan
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in {"1", "true", "yes"}
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT_MS = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "5000"))
+ADMISSION_LONG_MAX_INFLIGHT = int(os.getenv("ADMISSION_LONG_MAX_INFLIGHT", "4"))
+ADMISSION_LONG_MAX_QUEUE = int(os.getenv("ADMISSION_LONG_MAX_QUEUE", "8"))
+ADMISSION_BATCH_MAX_INFLIGHT = int(os.getenv("ADMISSION_BATCH_MAX_INFLIGHT", "2"))
+ADMISSION_BATCH_MAX_QUEUE = int(os.getenv("ADMISSION_BATCH_MAX_QUEUE", "4"))
+# Agents whose queries go to the "long" lane (comma-separated).
+ADMISSION_LONG_AGENTS = {
+    name.strip()
+    for name in os.getenv("ADMISSION_LONG_AGENTS", "onboarding_buddy_agent").split(",")
+    if name.strip()
+}
+# Bounds for the Retry-After hint, in seconds.
+ADMISSION_RETRY_AFTER_MIN = int(os.getenv("ADMISSION_RETRY_AFTER_MIN", "1"))
+ADMISSION_RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", "30"))
+
+LANES = ("general", "default", "long", "batch")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a lane's wait queue is full or the wait timed out."""
+
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({lane} lane {reason}); retry in {retry_after}s")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """In-flight counter plus a FIFO of waiters; a released slot is handed to the oldest waiter."""
+
+    def __init__(self, name: str, max_inflight: int, max_queue: int):
+        self.name = name
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Smoothed seconds a slot is held, for the Retry-After estimate.
+        self._hold_seconds = 1.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        backlog = (self.queued + 1) / self.max_inflight
+        estimate = math.ceil(backlog * self._hold_seconds)
+        return max(ADMISSION_RETRY_AFTER_MIN, min(ADMISSION_RETRY_AFTER_MAX, estimate))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        metrics.incr("admission_shed_total")
+        metrics.incr(f"admission_{self.name}_shed_{reason}")
+        return AdmissionRejected(self.name, reason, self.retry_after())
+
+    async def acquire(self, timeout: float) -> None:
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        metrics.observe(f"admission_{self.name}_queue_depth", self.queued)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            # Timed out just as a slot was handed over: pass it on.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise self._reject("timeout")
+        except asyncio.CancelledError:
+            # Cancelled right after being handed a slot: pass it on.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            metrics.observe(f"admission_{self.name}_wait_ms", (time.perf_counter() - started) * 1000)
+
+    def release(self, held_seconds: Optional[float] = None) -> None:
+        if held_seconds is not None:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held_seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot moves to this waiter; inflight unchanged
+                return
+        self.inflight -= 1
+
+
+class AdmissionController:
+    """Per-lane in-flight caps and bounded wait queues for /api/query."""
+
+    def __init__(
+        self,
+        enabled: bool = ADMISSION_ENABLED,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        long_max_inflight: int = ADMISSION_LONG_MAX_INFLIGHT,
+        long_max_queue: int = ADMISSION_LONG_MAX_QUEUE,
+        batch_max_inflight: int = ADMISSION_BATCH_MAX_INFLIGHT,
+        batch_max_queue: int = ADMISSION_BATCH_MAX_QUEUE,
+        queue_timeout_ms: int = ADMISSION_QUEUE_TIMEOUT_MS,
+    ):
+        self.enabled = enabled
+        self.queue_timeout = max(0, queue_timeout_ms) / 1000
+        self._limits = {
+            "default": (max_inflight, max_queue),
+            "long": (long_max_inflight, long_max_queue),
+            "batch": (batch_max_inflight, batch_max_queue),
+        }
+        self._lanes: Dict[str, _Lane] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _lane(self, name: str) -> _Lane:
+        """Lane state for the running loop (recreated if the loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lanes = {lane: _Lane(lane, *limits) for lane, limits in self._limits.items()}
+        return self._lanes[name]
+
+    @staticmethod
+    def classify(query: str) -> str:
+        """Lane for a query, from the same local rules the pipeline runs first."""
+        if match_general_rule(query) is not None:
+            return "general"
+        plan = heuristic_plan(query)
+        if plan is not None and any(step.agent in ADMISSION_LONG_AGENTS for step in plan.steps):
+            return "long"
+        return "default"
+
+    async def acquire(self, lane: str) -> None:
+        """Wait for a slot in ``lane``; raises AdmissionRejected when shedding."""
+        metrics.incr(f"admission_{lane}_requests")
+        if not self.enabled or lane == "general":
+            return
+        await self._lane(lane).acquire(self.queue_timeout)
+        metrics.observe("admission_inflight", self.inflight())
+
+    async def acquire_waiting(self, lane: str) -> None:
+        """Like ``acquire``, but wait out rejections instead of raising (background jobs)."""
+        while True:
+            try:
+                await self.acquire(lane)
+                return
+            except AdmissionRejected as exc:
+                await asyncio.sleep(exc.retry_after)
+
+    def release(self, lane: str, held_seconds: Optional[float] = None) -> None:
+        if not self.enabled or lane == "general":
+            return
+        self._lane(lane).release(held_seconds)
+
+    @asynccontextmanager
+    async def admit(self, lane: str, wait: bool = False) -> AsyncIterator[None]:
+        """Hold a slot in ``lane`` for the block; ``wait`` never sheds (see acquire_waiting)."""
+        await (self.acquire_waiting(lane) if wait else self.acquire(lane))
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(lane, time.monotonic() - started)
+
+    def inflight(self) -> int:
+        return sum(lane.inflight for lane in self._lanes.values())
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        report: Dict[str, Dict[str, float]] = {}
+        for name in LANES:
+            entry: Dict[str, float] = {
+                "requests": metrics.get_counter(f"admission_{name}_requests"),
+            }
+            if name in self._limits:
+                max_inflight, max_queue = self._limits[name]
+                lane = self._lanes.get(name)
+                entry.update(
+                    {
+                        "max_inflight": max_inflight,
+                        "max_queue": max_queue,
+                        "inflight": lane.inflight if lane else 0,
+                        "queued": lane.queued if lane else 0,
+                        "shed_queue_full": metrics.get_counter(f"admission_{name}_shed_queue_full"),
+                        "shed_timeout": metrics.get_counter(f"admission_{name}_shed_timeout"),
+                    }
+                )
+            report[name] = entry
+        return report
+
+
+admission = AdmissionController()
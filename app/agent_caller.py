@@ -9,13 +9,14 @@ from __future__ import annotations
 import json
 import os
 import uuid
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 try:
     import httpx  # type: ignore
 except ImportError:
     httpx = None
 
+from .deadline import Deadline
 from .models import AgentMetadata, AgentRequest, AgentResponse, ErrorModel, OutputModel
 
 
@@ -25,6 +26,7 @@ async def call_agent(
     text: str,
     context: Dict[str, Any],
     custom_input: Dict[str, Any] = None,
+    deadline: Optional[Deadline] = None,
 ) -> AgentResponse:
     """
     Build handshake request and invoke the worker. When endpoints are not real,
@@ -33,12 +35,15 @@ async def call_agent(
     Args:
         custom_input: Optional dict to override default input structure.
                      If provided, it replaces the entire input payload.
+        deadline: Optional request deadline; the HTTP timeout is capped by the
+                  remaining budget.
     """
 
     request_id = str(uuid.uuid4())
     
     # Build metadata with file uploads if available
     metadata: Dict[str, Any] = {"language": "en", "extra": {}}
+    input_text = text
     file_uploads = context.get("file_uploads", [])
     
     if file_uploads and len(file_uploads) > 0:
@@ -46,7 +51,21 @@ async def call_agent(
         # Note: Currently supports single file; can be extended for multiple files
         first_file = file_uploads[0]
         base64_data = first_file.get("base64_data", "")
-        if base64_data:  # Only add if not empty
+        if "text" in first_file:
+            # Text uploads were decoded by the supervisor: inline the content in
+            # input.text (same layout the UI uses) instead of shipping base64.
+            document = first_file["text"]
+            if first_file.get("truncated"):
+                # Tell the agent it is reading part of the document, not all of it.
+                document += f"\n\n[truncated after {len(first_file['text'])} chars]"
+            input_text = f"{text}\n\n--- Document Content ---\n\n{document}"
+            metadata["truncated"] = bool(first_file.get("truncated"))
+            metadata["mime_type"] = first_file.get("mime_type", "text/plain")
+            metadata["filename"] = first_file.get("filename", "uploaded_file")
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.info(f"Sending file to {agent_meta.name}: {first_file.get('filename', 'unknown')} ({len(first_file['text'])} chars text)")
+        elif base64_data:  # Only add if not empty
             metadata["file_base64"] = base64_data
             metadata["mime_type"] = first_file.get("mime_type", "application/octet-stream")
             metadata["filename"] = first_file.get("filename", "uploaded_file")
@@ -67,8 +86,8 @@ async def call_agent(
         request_id=request_id,
         agent_name=agent_meta.name,
         intent=intent,
-        input={"text": text, "metadata": metadata},
-        context=context,
+        input={"text": input_text, "metadata": metadata},
+        context=_handshake_context(context),
     )
 
     # Only live HTTP calls are supported; no simulation fallback.
@@ -77,7 +96,10 @@ async def call_agent(
             import logging
             logger = logging.getLogger(__name__)
             
-            async with httpx.AsyncClient(timeout=agent_meta.timeout_ms / 1000) as client:
+            timeout = agent_meta.timeout_ms / 1000
+            if deadline is not None:
+                timeout = deadline.timeout(timeout)
+            async with httpx.AsyncClient(timeout=timeout) as client:
                 # Special handling for budget_tracker_agent - it expects {"query": "..."} format
                 if agent_meta.name == "budget_tracker_agent":
                     payload = {"query": text}
@@ -185,3 +207,12 @@ async def call_agent(
             status="error",
             error=ErrorModel(type="config_error", message="Agent endpoint/command not configured"),
         )
+
+
+def _handshake_context(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Context for the handshake, minus decoded upload text already inlined in ``input.text``."""
+    uploads = context.get("file_uploads") or []
+    if not uploads or "text" not in uploads[0]:
+        return context
+    inlined = {key: value for key, value in uploads[0].items() if key != "text"}
+    return {**context, "file_uploads": [inlined] + list(uploads[1:])}
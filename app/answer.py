@@ -1,57 +1,144 @@
 """
 Final answer synthesis: combine tool outputs into a user-friendly response.
-Falls back to deterministic stitching when OpenRouter is unavailable.
+Falls back to deterministic stitching when no LLM backend is available.
+
+Single-agent answers can skip the LLM entirely: ``direct_answer`` applies the
+per-intent synthesis policy from the registry (pass-through or template) and
+only leaves multi-agent or low-confidence results for LLM synthesis.
 """
 from __future__ import annotations
 
 import json
 import os
-from typing import Dict, List, Optional
-
-try:
-    from openai import OpenAI  # type: ignore
-except ImportError:
-    OpenAI = None
+from typing import Any, Callable, Dict, List, Optional
 
-from .models import AgentResponse
+from . import metrics
+from .answer_cache import answer_cache, answer_key
+from .deadline import Deadline
+from .llm import get_gateway
+from .models import AgentMetadata, AgentResponse, Plan
+from .output_reduction import reduce_tool_outputs
 
 
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-2.5-flash-lite")
+# Token budget for conversation history in the answer prompt.
+ANSWER_HISTORY_TOKENS = int(os.getenv("ANSWER_HISTORY_TOKENS", "1200"))
+# "auto" applies per-intent pass-through/template policies; "llm" always synthesizes.
+SYNTHESIS_POLICY = os.getenv("SYNTHESIS_POLICY", "auto").lower()
+# Agent outputs reporting a lower confidence always go through the LLM.
+ANSWER_MIN_CONFIDENCE = float(os.getenv("ANSWER_MIN_CONFIDENCE", "0.5"))
+
+
+def direct_answer(plan: Plan, step_outputs: Dict[int, AgentResponse], registry: List[AgentMetadata]) -> Optional[str]:
+    """
+    Answer a single successful step without the LLM when its intent's policy
+    allows it; None means the caller should synthesize with the LLM.
+    """
+    if SYNTHESIS_POLICY != "auto" or len(plan.steps) != 1 or len(step_outputs) != 1:
+        return None
+    step = plan.steps[0]
+    response = step_outputs.get(step.step_id)
+    if response is None or not response.is_success():
+        return None
+    output = response.output
+    if output.confidence is not None and output.confidence < ANSWER_MIN_CONFIDENCE:
+        return None
+    agent = next((a for a in registry if a.name == step.agent), None)
+    mode = agent.synthesis.get(step.intent) if agent is not None else None
+
+    answer: Optional[str] = None
+    if mode == "passthrough" and isinstance(output.result, str):
+        answer = output.result.strip() or None
+    elif mode == "template":
+        answer = render_template(output.result)
+    if answer is not None:
+        metrics.incr(f"answer_synthesis_{mode}")
+    return answer
+
+
+def render_template(result: Any) -> Optional[str]:
+    """
+    Deterministic markdown for structured agent output. ``details`` is left
+    out: agents put raw payloads there (budget tracker: a JSON dump).
+    """
+    body = _render_value(result).strip()
+    return body or None
+
+
+def _render_value(value: Any, indent: int = 0) -> str:
+    pad = "  " * indent
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            label = str(key).replace("_", " ").capitalize()
+            if isinstance(item, (dict, list)) and item:
+                lines.append(f"{pad}- **{label}**:\n{_render_value(item, indent + 1)}")
+            else:
+                lines.append(f"{pad}- **{label}**: {_scalar(item)}")
+        return "\n".join(lines)
+    if isinstance(value, list):
+        lines = []
+        for item in value:
+            if isinstance(item, dict) and item and not any(isinstance(v, (dict, list)) for v in item.values()):
+                # Flat records (e.g. one project or task) fit on one line.
+                fields = "; ".join(f"{str(k).replace('_', ' ')}: {_scalar(v)}" for k, v in item.items())
+                lines.append(f"{pad}- {fields}")
+            elif isinstance(item, (dict, list)) and item:
+                lines.append(f"{pad}-\n{_render_value(item, indent + 1)}")
+            else:
+                lines.append(f"{pad}- {_scalar(item)}")
+        return "\n".join(lines)
+    return f"{pad}{_scalar(value)}"
 
 
-def compose_final_answer(query: str, step_outputs: Dict[int, AgentResponse], history: Optional[List] = None) -> str:
-    """Convert tool outputs into a concise answer."""
+def _scalar(value: Any) -> str:
+    if value is None or value == [] or value == {}:
+        return "—"
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    return str(value)
+
+
+async def compose_final_answer(
+    query: str,
+    step_outputs: Dict[int, AgentResponse],
+    history: Optional[List] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+    deadline: Optional[Deadline] = None,
+) -> str:
+    """
+    Convert tool outputs into a concise answer. When ``on_token`` is given the
+    LLM response is streamed and each text delta is passed to it as it arrives.
+    The LLM call is bounded by the remaining ``deadline`` budget; with no budget
+    left the stitched tool results are returned directly.
+    """
     # If no steps were executed, treat as out-of-scope.
     if not step_outputs:
         return "This information is not in my scope."
 
     successful = [s for s in step_outputs.values() if s.is_success()]
     if not successful:
+        if any(s.status == "pending" for s in step_outputs.values()):
+            return "I'm still working on your request."
         return "I could not complete your request because every tool failed. Please try again."
 
     # For document summarizer, return the markdown directly
     stitched = " | ".join(str(s.output.result) for s in successful if s.output)
 
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if OpenAI is None or not api_key:
+    gateway = get_gateway()
+    if not gateway.available():
         return stitched  # Return markdown directly without prefix
+    if deadline is not None and deadline.expired:
+        return stitched
 
-    try:
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-        )
-    except Exception:
-        return f"Based on the tools, here is what I found: {stitched}"
-    tool_findings = [
-        {
-            "agent": s.agent_name,
-            "status": s.status,
-            "result": s.output.result if s.output else None,
-            "details": s.output.details if s.output else None,
-        }
-        for s in step_outputs.values()
-    ]
+    tool_findings, _ = reduce_tool_outputs(query, step_outputs)
+    cache_key = answer_key(OPENROUTER_MODEL, query, tool_findings, history)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        if on_token is not None:
+            on_token(cached)
+        return cached
+    metrics.incr("answer_synthesis_llm")
 
     system_prompt = (
         "You are a helpful assistant. Given the user's query and tool outputs, "
@@ -60,16 +147,34 @@ def compose_final_answer(query: str, step_outputs: Dict[int, AgentResponse], his
     user_payload = {"user_query": query, "tool_outputs": tool_findings}
     if history:
         user_payload["recent_history"] = history
-    user_prompt = json.dumps(user_payload, indent=2)
+    user_prompt = json.dumps(user_payload, separators=(",", ":"), ensure_ascii=False, default=str)
 
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    timeout = deadline.remaining() if deadline is not None else None
+    parts: List[str] = []
     try:
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-        )
-        return response.choices[0].message.content.strip() if response.choices else stitched
+        if on_token is not None:
+            deltas = gateway.stream("answer", OPENROUTER_MODEL, messages, timeout=timeout)
+            complete = True
+            try:
+                async for delta in deltas:
+                    parts.append(delta)
+                    on_token(delta)
+                    if deadline is not None and deadline.expired:
+                        complete = False
+                        break
+            finally:
+                await deltas.aclose()
+            answer = "".join(parts).strip()
+            if complete:
+                answer_cache.put(cache_key, answer)
+            return answer or stitched
+        result = await gateway.complete("answer", OPENROUTER_MODEL, messages, timeout=timeout)
+        answer_cache.put(cache_key, result.content)
+        return result.content or stitched
     except Exception:
-        return stitched
+        # Keep whatever already streamed rather than contradicting it.
+        return "".join(parts).strip() or stitched
@@ -0,0 +1,45 @@
+"""
+Answer cache in front of LLM answer synthesis. Answers are keyed by the model,
+the normalized query, the (reduced) tool outputs the LLM would see and the
+history window, so a repeated question over unchanged agent data is answered
+instantly. Entries are evicted LRU-first and expire after a TTL.
+
+Only complete LLM answers are stored; stitched fallbacks and answers cut short
+by a deadline are not.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from .plan_cache import normalize_query
+from .ttl_cache import TTLCache
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300"))
+
+
+def _digest(value: Any) -> str:
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def answer_key(model: str, query: str, tool_findings: List[Dict[str, Any]], history: Optional[List] = None) -> str:
+    """Cache key for an answer synthesized from these inputs."""
+    return _digest([model, normalize_query(query), tool_findings, history or []])
+
+
+class AnswerCache(TTLCache[str, str]):
+    """Thread-safe LRU + TTL cache of synthesized answers."""
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        super().__init__(max_entries, ttl_seconds, name="answer_cache")
+
+    def put(self, key: str, answer: str) -> None:
+        if answer:
+            super().put(key, answer)
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,77 @@
+"""
+Batch query execution for bulk/nightly workloads. All queries are prepared up
+front, the local intent classifier scores them in one batched pass, identical
+queries share one planning call (and one LLM bucket token), plans are executed with a shared
+per-agent/intent limiter, and results are yielded as soon as each query
+completes so the endpoint can stream them back as NDJSON.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .executor import AgentLimiter
+from .intent_classifier import intent_classifier
+from .models import BatchItemResult, ErrorModel, FrontendRequest, Plan
+from .pipeline import PreparedQuery, finish_query, is_short_circuit, plan_query, prepare_query
+from .rate_limit import RateLimited
+from .registry import load_registry
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+BATCH_AGENT_CONCURRENCY = int(os.getenv("BATCH_AGENT_CONCURRENCY", "4"))
+
+
+def _plan_key(prepared: PreparedQuery) -> Tuple[str, ...]:
+    """Queries with the same text and history can share one plan."""
+    turns = tuple(f"{turn.get('role')}:{turn.get('content')}" for turn in prepared.history)
+    return (prepared.query_text.strip().lower(),) + turns
+
+
+async def run_batch(queries: List[FrontendRequest]) -> AsyncIterator[BatchItemResult]:
+    """Run many queries concurrently, yielding each result as it completes."""
+    registry = load_registry()
+    limiter = AgentLimiter(BATCH_AGENT_CONCURRENCY)
+    gate = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    shared_plans: Dict[Tuple[str, ...], asyncio.Task] = {}
+    # Score every query against the local classifier in one pass up front.
+    texts = list({payload.query for payload in queries})
+    classified = dict(zip(texts, intent_classifier.classify_many(texts, registry)))
+
+    def shared_plan(prepared: PreparedQuery) -> asyncio.Task:
+        key = _plan_key(prepared)
+        if key not in shared_plans:
+            shared_plans[key] = asyncio.ensure_future(plan_query(prepared, registry, classified))
+        return shared_plans[key]
+
+    async def run_one(index: int, payload: FrontendRequest) -> BatchItemResult:
+        if not payload.query.strip():
+            return BatchItemResult(index=index, error=ErrorModel(type="validation_error", message="Query cannot be empty"))
+        async with gate:
+            try:
+                prepared = prepare_query(payload)
+                plan: Optional[Plan] = None
+                if not is_short_circuit(prepared):
+                    plan = await shared_plan(prepared)
+                response = await finish_query(prepared, plan, registry, limiter=limiter)
+                return BatchItemResult(index=index, response=response)
+            except RateLimited as exc:
+                return BatchItemResult(index=index, error=ErrorModel(type="rate_limited", message=str(exc)))
+            except Exception as exc:
+                logger.error("Batch query %s failed: %s", index, exc)
+                return BatchItemResult(index=index, error=ErrorModel(type="internal_error", message=str(exc)))
+
+    tasks = [asyncio.ensure_future(run_one(i, payload)) for i, payload in enumerate(queries)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away mid-stream: don't leave orphaned work running.
+        for task in tasks:
+            task.cancel()
+        for task in shared_plans.values():
+            task.cancel()
@@ -3,13 +3,41 @@ In-memory conversation tracking for chat context.
 
 This is intentionally lightweight and per-process. For production, replace with
 a persistent store (Redis/DB) and add TTLs or user scoping as needed.
+
+Prompts take history through ``get_history_window``, which picks the newest
+turns that fit a token budget (each consumer has its own). Older turns can be
+folded into a rolling summary, updated incrementally by background tasks, so
+prompt size stays flat as a conversation grows.
 """
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from .llm import get_gateway
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "false").lower() in {"1", "true", "yes"}
+# Raw turns kept out of the summary; anything older is folded into it.
+HISTORY_SUMMARY_KEEP_TURNS = int(os.getenv("HISTORY_SUMMARY_KEEP_TURNS", "6"))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "200"))
+HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL") or os.getenv("OPENROUTER_MODEL", "google/gemini-2.5-flash-lite")
 
 # {conversation_id: [{"role": "user"/"assistant", "content": str}]}
 _HISTORY: Dict[str, List[Dict[str, str]]] = {}
+# {conversation_id: (summary text, number of leading turns it covers)}
+_SUMMARIES: Dict[str, Tuple[str, int]] = {}
+# Conversations with a summary update in flight (one at a time each).
+_summarizing: Set[str] = set()
+_summary_tasks: Set["asyncio.Task"] = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4
 
 
 def get_history(conversation_id: str, limit: int = 6) -> List[Dict[str, str]]:
@@ -20,6 +48,100 @@ def get_history(conversation_id: str, limit: int = 6) -> List[Dict[str, str]]:
     return history[-limit:]
 
 
+def get_history_window(conversation_id: str, budget_tokens: int) -> List[Dict[str, str]]:
+    """
+    Newest turns that fit within ``budget_tokens``, preceded by the rolling
+    summary of older turns when one exists. The newest turn is truncated
+    rather than dropped if it alone exceeds the budget.
+    """
+    history = _HISTORY.get(conversation_id, [])
+    if not history or budget_tokens <= 0:
+        return []
+    summary, covered = _SUMMARIES.get(conversation_id, ("", 0))
+
+    summary_turn: Optional[Dict[str, str]] = None
+    remaining = budget_tokens
+    if summary:
+        summary_turn = {"role": "system", "content": f"Summary of earlier conversation: {summary}"}
+        cost = estimate_tokens(summary_turn["content"])
+        if cost < remaining:
+            remaining -= cost
+        else:
+            summary_turn = None
+
+    window: List[Dict[str, str]] = []
+    for turn in reversed(history[covered:]):
+        cost = estimate_tokens(turn["content"])
+        if cost <= remaining:
+            window.append(turn)
+            remaining -= cost
+            continue
+        if not window:
+            window.append({"role": turn["role"], "content": turn["content"][: remaining * 4] + "…"})
+        break
+    window.reverse()
+    return [summary_turn] + window if summary_turn else window
+
+
 def append_turn(conversation_id: str, role: str, content: str) -> None:
     """Record a turn in the conversation."""
-    _HISTORY.setdefault(conversation_id, []).append({"role": role, "content": content})
+    history = _HISTORY.setdefault(conversation_id, [])
+    history.append({"role": role, "content": content})
+    if HISTORY_SUMMARY_ENABLED:
+        _maybe_schedule_summary(conversation_id, len(history))
+
+
+def _maybe_schedule_summary(conversation_id: str, total_turns: int) -> None:
+    """Fold turns older than the kept window into the summary, one task per conversation."""
+    _, covered = _SUMMARIES.get(conversation_id, ("", 0))
+    if total_turns - covered <= HISTORY_SUMMARY_KEEP_TURNS or conversation_id in _summarizing:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # no loop (sync caller): the next turn recorded from a request retries
+    _summarizing.add(conversation_id)
+    task = loop.create_task(_update_summary(conversation_id))
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
+
+
+async def _update_summary(conversation_id: str) -> None:
+    try:
+        summary, covered = _SUMMARIES.get(conversation_id, ("", 0))
+        history = _HISTORY.get(conversation_id, [])
+        upto = len(history) - HISTORY_SUMMARY_KEEP_TURNS
+        if upto <= covered:
+            return
+        text = await _summarize(summary, history[covered:upto])
+        if text:
+            _SUMMARIES[conversation_id] = (text, upto)
+    except Exception as exc:
+        logger.error("History summary failed for %s: %s", conversation_id, exc)
+    finally:
+        _summarizing.discard(conversation_id)
+
+
+async def _summarize(previous: str, turns: List[Dict[str, str]]) -> Optional[str]:
+    """Extend ``previous`` with ``turns`` using the LLM; None when unavailable."""
+    gateway = get_gateway()
+    if not gateway.available():
+        return None
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    result = await gateway.complete(
+        "summary",
+        HISTORY_SUMMARY_MODEL,
+        [
+            {
+                "role": "system",
+                "content": (
+                    "Update the running summary of a conversation with the new turns. Keep facts, "
+                    "names, numbers and open requests; drop pleasantries. Reply with the summary only, "
+                    f"at most {HISTORY_SUMMARY_MAX_TOKENS * 3 // 4} words."
+                ),
+            },
+            {"role": "user", "content": f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"},
+        ],
+        max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+    )
+    return result.content or None
@@ -0,0 +1,47 @@
+"""
+Per-request time budget. A Deadline is created when a query arrives and passed
+down through planning, agent calls and answer synthesis; each stage uses the
+remaining budget as its timeout so the endpoint has a hard upper bound and
+returns partial results instead of running on. Write intents that have
+already started are not cut off (see ``execute_plan``).
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Optional
+
+from .models import FrontendOptions
+
+# Default end-to-end budget per query; 0 (the default) disables the deadline.
+# When set, keep it above the largest agent timeout_ms in the registry.
+REQUEST_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", "0"))
+
+
+class Deadline:
+    """Monotonic-clock deadline with helpers for per-stage timeouts."""
+
+    def __init__(self, budget_ms: int):
+        self.budget_ms = budget_ms
+        self._expires_at = time.monotonic() + budget_ms / 1000
+
+    @classmethod
+    def from_options(cls, options: Optional[FrontendOptions]) -> Optional["Deadline"]:
+        """Build the request deadline from client options or the configured default."""
+        budget_ms = options.deadline_ms if options and options.deadline_ms else REQUEST_DEADLINE_MS
+        if budget_ms <= 0:
+            return None
+        return cls(budget_ms)
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(0.0, self._expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Remaining budget, optionally capped by a stage's own timeout (seconds)."""
+        remaining = self.remaining()
+        return min(remaining, cap) if cap is not None else remaining
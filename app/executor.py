@@ -4,8 +4,11 @@ outputs for later synthesis or UI debugging.
 """
 from __future__ import annotations
 
+import asyncio
+import logging
+import time
 import uuid
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 try:
     import httpx  # type: ignore
@@ -13,8 +16,69 @@ except ImportError:
     httpx = None
 
 from .agent_caller import call_agent
+from .deadline import Deadline
+from .followups import followup_manager
 from .models import AgentMetadata, AgentRequest, AgentResponse, ErrorModel, Plan, UsedAgentEntry
 from .registry import find_agent_by_name
+from .speculation import Speculation
+from .tasks_proxy import tasks_proxy
+
+logger = logging.getLogger(__name__)
+
+# Progress listener: receives (event_name, data) as steps start and finish.
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class AgentLimiter:
+    """
+    Caps concurrent calls per (agent, intent) group. Shared across many plans
+    (e.g. a batch) so a burst of identical requests does not flood one worker.
+    """
+
+    def __init__(self, per_group: int):
+        self.per_group = max(1, per_group)
+        self._slots: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+
+    def slot(self, agent: str, intent: str) -> asyncio.Semaphore:
+        key = (agent, intent)
+        if key not in self._slots:
+            self._slots[key] = asyncio.Semaphore(self.per_group)
+        return self._slots[key]
+
+
+async def _limited_call(
+    limiter: Optional[AgentLimiter],
+    agent_meta: AgentMetadata,
+    intent: str,
+    text: str,
+    context: Dict[str, Any],
+    deadline: Optional[Deadline] = None,
+) -> AgentResponse:
+    """call_agent, holding the (agent, intent) slot when a limiter is given."""
+    if limiter is None:
+        return await call_agent(agent_meta, intent, text, context, deadline=deadline)
+    async with limiter.slot(agent_meta.name, intent):
+        return await call_agent(agent_meta, intent, text, context, deadline=deadline)
+
+
+def deadline_response(agent_name: str, message: str) -> AgentResponse:
+    """Structured error for a step that ran out of request budget."""
+    return AgentResponse(
+        request_id=str(uuid.uuid4()),
+        agent_name=agent_name,
+        status="error",
+        error=ErrorModel(type="deadline_exceeded", message=message),
+    )
+
+
+def emit_event(on_event: Optional[EventCallback], event: str, data: Dict[str, Any]) -> None:
+    """Invoke a progress listener, never letting it break plan execution."""
+    if on_event is None:
+        return
+    try:
+        on_event(event, data)
+    except Exception as exc:
+        logger.warning("Progress listener failed for %s: %s", event, exc)
 
 
 def resolve_input(input_source: str, user_query: str, step_outputs: Dict[int, AgentResponse]) -> str:
@@ -43,50 +107,151 @@ async def execute_plan(
     plan: Plan,
     registry: List[AgentMetadata],
     context: Dict[str, Any],
+    on_event: Optional[EventCallback] = None,
+    limiter: Optional[AgentLimiter] = None,
+    speculation: Optional[Speculation] = None,
+    deadline: Optional[Deadline] = None,
+    step_outputs: Optional[Dict[int, AgentResponse]] = None,
+    used_agents: Optional[List[UsedAgentEntry]] = None,
 ) -> Tuple[Dict[int, AgentResponse], List[UsedAgentEntry]]:
-    """Execute each planned step in order and capture responses."""
-    step_outputs: Dict[int, AgentResponse] = {}
-    used_agents: List[UsedAgentEntry] = []
+    """
+    Execute each planned step in order and capture responses. When ``on_event``
+    is given it receives ``step_started``/``step_finished`` events per call;
+    ``limiter`` bounds concurrent calls per agent/intent across plans; a
+    matching ``speculation`` is reused instead of issuing the call again.
+    Once ``deadline`` passes, an in-flight read-only call is cancelled and
+    remaining steps are recorded as ``deadline_exceeded`` errors; a write
+    intent already started runs to completion under its own agent timeout, so
+    it is never abandoned halfway. Results are written
+    into ``step_outputs``/``used_agents`` when given, so callers can observe
+    progress while the plan runs.
+    """
+    step_outputs = step_outputs if step_outputs is not None else {}
+    used_agents = used_agents if used_agents is not None else []
 
     for step in plan.steps:
         agent_meta = find_agent_by_name(step.agent, registry)
         text = resolve_input(step.input_source, query, step_outputs)
+        emit_event(on_event, "step_started", {"step_id": step.step_id, "agent": agent_meta.name, "intent": step.intent})
+        started = time.perf_counter()
         # Pass file uploads from context to agent caller
-        response = await call_agent(agent_meta, step.intent, text, context)
+        in_flight = speculation.claim(agent_meta.name, step.intent, text) if speculation else None
+        if deadline is not None and deadline.expired:
+            if in_flight is not None:
+                in_flight.cancel()
+            response = deadline_response(agent_meta.name, "Skipped: request deadline reached before this step")
+        else:
+            # Only read-only calls may be cut off by the request deadline.
+            step_deadline = deadline if step.intent in agent_meta.read_only_intents else None
+            call = in_flight if in_flight is not None else _limited_call(
+                limiter, agent_meta, step.intent, text, context, deadline=step_deadline
+            )
+            try:
+                if step_deadline is None:
+                    response = await call
+                else:
+                    response = await asyncio.wait_for(call, step_deadline.remaining())
+            except asyncio.TimeoutError:
+                response = deadline_response(agent_meta.name, "Cancelled: request deadline reached during this call")
         step_outputs[step.step_id] = response
         used_agents.append(
             UsedAgentEntry(name=agent_meta.name, intent=step.intent, status=response.status)
         )
+        emit_event(
+            on_event,
+            "step_finished",
+            {
+                "step_id": step.step_id,
+                "agent": agent_meta.name,
+                "intent": step.intent,
+                "status": response.status,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            },
+        )
         
-        # Auto-trigger TDA after KnowledgeBaseBuilderAgent successfully creates tasks
+        if response.status == "success":
+            # The tasks page must not keep showing the list from before this write.
+            tasks_proxy.invalidate_for(agent_meta.name)
+
+        # Auto-trigger TDA after KnowledgeBaseBuilderAgent successfully creates tasks.
+        # Dependency resolution runs as a background follow-up so the answer is
+        # not held up by it; triggers in a short window share one TDA run.
         if (step.agent == "KnowledgeBaseBuilderAgent" and 
             response.status == "success" and 
             step.intent == "create_task"):
             try:
-                tda_meta = find_agent_by_name("task_dependency_agent", registry)
-                # Call TDA with database trigger - it will retrieve tasks from MongoDB
-                tda_response = await call_agent(
-                    tda_meta,
-                    "task.resolve_dependencies",
-                    "",  # Empty text since TDA uses trigger
-                    context,
-                    custom_input={"trigger": "database_update"}  # Signal to retrieve from DB
-                )
-                # Add TDA to outputs with next step_id
-                next_step_id = max(step_outputs.keys()) + 1 if step_outputs else 0
-                step_outputs[next_step_id] = tda_response
+                followup = followup_manager.schedule_dependency_resolution(registry, context)
                 used_agents.append(
-                    UsedAgentEntry(
-                        name=tda_meta.name,
-                        intent="task.resolve_dependencies",
-                        status=tda_response.status
-                    )
+                    UsedAgentEntry(name=followup.agent, intent=followup.intent, status="scheduled")
+                )
+                emit_event(
+                    on_event,
+                    "followup_scheduled",
+                    {"followup_id": followup.followup_id, "agent": followup.agent, "intent": followup.intent},
                 )
             except KeyError:
                 # TDA not found in registry, skip auto-trigger
                 pass
-            except Exception:
-                # TDA call failed, continue without blocking
-                pass
 
     return step_outputs, used_agents
+
+
+async def execute_plan_soft(
+    query: str,
+    plan: Plan,
+    registry: List[AgentMetadata],
+    context: Dict[str, Any],
+    soft_deadline: float,
+    on_event: Optional[EventCallback] = None,
+    limiter: Optional[AgentLimiter] = None,
+    speculation: Optional[Speculation] = None,
+    deadline: Optional[Deadline] = None,
+) -> Tuple[Dict[int, AgentResponse], List[UsedAgentEntry], Optional["asyncio.Task"]]:
+    """
+    Run ``execute_plan`` but stop waiting after ``soft_deadline`` seconds.
+
+    Returns the steps finished so far, with unfinished steps marked
+    ``pending``, plus the still-running task (None if everything finished in
+    time). That task keeps running, still bound by the hard ``deadline``, and
+    resolves to the complete ``(step_outputs, used_agents)``. Cancelling the
+    caller before the soft deadline cancels the plan too.
+    """
+    live_outputs: Dict[int, AgentResponse] = {}
+    live_used: List[UsedAgentEntry] = []
+    task = asyncio.ensure_future(
+        execute_plan(
+            query,
+            plan,
+            registry,
+            context,
+            on_event=on_event,
+            limiter=limiter,
+            speculation=speculation,
+            deadline=deadline,
+            step_outputs=live_outputs,
+            used_agents=live_used,
+        )
+    )
+    try:
+        done, _ = await asyncio.wait({task}, timeout=soft_deadline)
+    except asyncio.CancelledError:
+        # The caller went away (e.g. client disconnect): don't orphan the plan.
+        task.cancel()
+        raise
+    if done:
+        step_outputs, used_agents = task.result()
+        return step_outputs, used_agents, None
+
+    partial_outputs = dict(live_outputs)
+    partial_used = list(live_used)
+    for step in plan.steps:
+        if step.step_id in partial_outputs:
+            continue
+        partial_outputs[step.step_id] = AgentResponse(
+            request_id=str(uuid.uuid4()),
+            agent_name=step.agent,
+            status="pending",
+            error=ErrorModel(type="pending", message="Still running; the result will follow in this conversation."),
+        )
+        partial_used.append(UsedAgentEntry(name=step.agent, intent=step.intent, status="pending"))
+    return partial_outputs, partial_used, task
@@ -4,8 +4,11 @@ Centralizes file upload parsing and validation logic.
 """
 from __future__ import annotations
 
+import base64
+import binascii
+import os
 import re
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 # Constants
 FILE_UPLOAD_MARKER_PATTERN = r'\[FILE_UPLOAD:(.+):([^:]+):([^\]]+)\]'
@@ -17,6 +20,14 @@ SUPPORTED_MIME_TYPES = {
     'application/pdf',
     'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
 }
+# Text formats are decoded once here and forwarded as plain text; binary
+# formats (PDF/DOCX) keep travelling as base64.
+TEXT_MIME_TYPES = {
+    'text/plain',
+    'text/markdown',
+    'text/x-markdown',
+}
+MAX_INLINE_TEXT_CHARS = int(os.getenv("MAX_INLINE_TEXT_CHARS", "200000"))
 
 
 def extract_base64_from_data_url(data_url: str) -> str:
@@ -132,10 +143,45 @@ def validate_file_upload(file_upload: Dict[str, str]) -> bool:
     return True
 
 
+def decode_text_upload(file_upload: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    Decode a text/markdown upload into a compact plain-text upload.
+    
+    Args:
+        file_upload: Validated upload dict with base64_data, filename, mime_type
+        
+    Returns:
+        Dict with text, filename, mime_type and truncated flag, or None if the
+        upload is not a text format or cannot be decoded (caller keeps base64)
+    """
+    mime_type = (file_upload.get('mime_type') or '').lower()
+    if mime_type not in TEXT_MIME_TYPES:
+        return None
+    
+    try:
+        raw = base64.b64decode(file_upload['base64_data'], validate=False)
+    except (binascii.Error, ValueError):
+        return None
+    
+    text = raw.decode('utf-8', errors='replace')
+    # Normalize: drop BOM, unify line endings, trim surrounding whitespace
+    text = text.lstrip('\ufeff').replace('\r\n', '\n').replace('\r', '\n').strip()
+    truncated = len(text) > MAX_INLINE_TEXT_CHARS
+    if truncated:
+        text = text[:MAX_INLINE_TEXT_CHARS]
+    
+    return {
+        'text': text,
+        'filename': file_upload.get('filename', 'uploaded_file'),
+        'mime_type': mime_type,
+        'truncated': truncated,
+    }
+
+
 def normalize_file_uploads(
     structured_uploads: Optional[List[Dict[str, str]]],
     query_text: str
-) -> tuple[str, List[Dict[str, str]]]:
+) -> tuple[str, List[Dict[str, Any]]]:
     """
     Normalize file uploads from either structured field or query text markers.
     
@@ -144,9 +190,10 @@ def normalize_file_uploads(
         query_text: Query text that may contain file upload markers (fallback)
         
     Returns:
-        Tuple of (cleaned_query_text, validated_file_uploads)
+        Tuple of (cleaned_query_text, validated_file_uploads). Text uploads are
+        decoded to a ``text`` field; binary uploads keep ``base64_data``.
     """
-    file_uploads: List[Dict[str, str]] = []
+    file_uploads: List[Dict[str, Any]] = []
     
     # Prefer structured uploads if available
     if structured_uploads:
@@ -159,5 +206,8 @@ def normalize_file_uploads(
         query_text = clean_query
         file_uploads.extend(parsed_uploads)
     
+    # Decode text formats once so agents receive plain text instead of base64
+    file_uploads = [decode_text_upload(upload) or upload for upload in file_uploads]
+    
     return query_text, file_uploads
 
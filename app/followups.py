@@ -0,0 +1,255 @@
+"""
+Background follow-ups: work that finishes after the supervisor has answered.
+This covers task dependency resolution after KnowledgeBaseBuilderAgent creates
+a task (triggers that arrive while a run is still pending are coalesced into
+it, and runs of the same kind never overlap) and slow plan steps that were
+still running when a soft-deadline answer was returned.
+
+State is in-memory and per-process, like the conversation store.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
+
+from .agent_caller import call_agent
+from .models import AgentMetadata, AgentResponse, FollowupInfo
+from .registry import find_agent_by_name
+from .streaming import EventLog
+from .tasks_proxy import tasks_proxy
+
+logger = logging.getLogger(__name__)
+
+FOLLOWUP_COALESCE_SECONDS = float(os.getenv("FOLLOWUP_COALESCE_SECONDS", "3"))
+FOLLOWUP_HISTORY = int(os.getenv("FOLLOWUP_HISTORY", "50"))
+
+DEPENDENCY_AGENT = "task_dependency_agent"
+DEPENDENCY_INTENT = "task.resolve_dependencies"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Followup(EventLog):
+    """One background agent run and the triggers folded into it."""
+
+    def __init__(self, agent: str, intent: str, conversation_id: Optional[str], scoped: bool = False):
+        super().__init__()
+        self.followup_id = str(uuid.uuid4())
+        self.agent = agent
+        self.intent = intent
+        self.status = "pending"
+        self.triggers = 1
+        self.conversation_ids: List[str] = [conversation_id] if conversation_id else []
+        self.created_at = _now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.result: Optional[AgentResponse] = None
+        self.answer: Optional[str] = None
+        # Carries a per-conversation answer: only listed for its own conversation.
+        self.scoped = scoped
+
+    @property
+    def finished(self) -> bool:
+        return self.status in {"done", "error"}
+
+    def add_trigger(self, conversation_id: Optional[str]) -> None:
+        self.triggers += 1
+        if conversation_id and conversation_id not in self.conversation_ids:
+            self.conversation_ids.append(conversation_id)
+        self.record("coalesced", {"triggers": self.triggers})
+
+    def info(self) -> FollowupInfo:
+        return FollowupInfo(
+            followup_id=self.followup_id,
+            agent=self.agent,
+            intent=self.intent,
+            status=self.status,
+            triggers=self.triggers,
+            conversation_ids=list(self.conversation_ids),
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            events=list(self.events),
+            result=self.result,
+            answer=self.answer,
+        )
+
+
+class FollowupManager:
+    """Schedules, coalesces and records background follow-up runs."""
+
+    def __init__(self, coalesce_seconds: float = FOLLOWUP_COALESCE_SECONDS, history: int = FOLLOWUP_HISTORY):
+        self.coalesce_seconds = max(0.0, coalesce_seconds)
+        self.history = max(1, history)
+        self._runs: "OrderedDict[str, Followup]" = OrderedDict()
+        self._pending: Dict[str, Followup] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule_dependency_resolution(self, registry: List[AgentMetadata], context: Dict[str, Any]) -> Followup:
+        """
+        Queue a task_dependency_agent run (database trigger). Raises KeyError if
+        the agent is not registered.
+        """
+        agent_meta = find_agent_by_name(DEPENDENCY_AGENT, registry)
+        # The follow-up outlives the request; it does not need uploaded files.
+        run_context = {k: v for k, v in context.items() if k != "file_uploads"}
+        return self._schedule(agent_meta, DEPENDENCY_INTENT, run_context, custom_input={"trigger": "database_update"})
+
+    def track(
+        self,
+        agent: str,
+        intent: str,
+        conversation_id: Optional[str],
+        work: Awaitable[Tuple[Optional[AgentResponse], Optional[str]]],
+    ) -> Followup:
+        """
+        Track already-running work that resolves to ``(agent_response, answer)``;
+        no coalescing or delay is applied.
+        """
+        run = Followup(agent, intent, conversation_id, scoped=True)
+        run.status = "running"
+        run.started_at = _now()
+        run.record("started", {})
+        self._remember(run)
+
+        async def _wait() -> None:
+            try:
+                run.result, run.answer = await work
+                run.status = "error" if run.result is not None and run.result.status != "success" else "done"
+            except asyncio.CancelledError:
+                # Still finish the run so pollers and event streams see an outcome.
+                logger.warning("Follow-up %s (%s) was cancelled", run.followup_id, agent)
+                run.status = "error"
+                raise
+            except Exception as exc:
+                logger.error("Follow-up %s (%s) failed: %s", run.followup_id, agent, exc)
+                run.status = "error"
+            finally:
+                run.finished_at = _now()
+                run.record(run.status, {"answer": run.answer})
+
+        self._spawn(_wait())
+        return run
+
+    def _remember(self, run: Followup) -> None:
+        self._runs[run.followup_id] = run
+        while len(self._runs) > self.history:
+            self._runs.popitem(last=False)
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        # Hold a reference so the task is not garbage-collected mid-run.
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _schedule(
+        self,
+        agent_meta: AgentMetadata,
+        intent: str,
+        context: Dict[str, Any],
+        custom_input: Optional[Dict[str, Any]] = None,
+    ) -> Followup:
+        key = f"{agent_meta.name}:{intent}"
+        conversation_id = context.get("conversation_id")
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.add_trigger(conversation_id)
+            return pending
+
+        run = Followup(agent_meta.name, intent, conversation_id)
+        run.record("pending", {"coalesce_seconds": self.coalesce_seconds})
+        self._pending[key] = run
+        self._remember(run)
+        self._spawn(self._run(key, run, agent_meta, context, custom_input))
+        return run
+
+    async def _run(
+        self,
+        key: str,
+        run: Followup,
+        agent_meta: AgentMetadata,
+        context: Dict[str, Any],
+        custom_input: Optional[Dict[str, Any]],
+    ) -> None:
+        try:
+            # Give bursts of triggers a moment to fold into this run.
+            await asyncio.sleep(self.coalesce_seconds)
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                # Once started, later triggers must schedule a fresh run so tasks
+                # created after this point are still picked up.
+                self._clear_pending(key, run)
+                await self._call(run, agent_meta, context, custom_input)
+        except asyncio.CancelledError:
+            if run.finished_at is None:
+                # Cancelled before it started: close it so pollers see an outcome.
+                logger.warning("Follow-up %s (%s) was cancelled before starting", run.followup_id, agent_meta.name)
+                run.status = "error"
+                run.finished_at = _now()
+                run.record(run.status, {"agent_status": None})
+            raise
+        finally:
+            # Later triggers must never attach to a run that can no longer fire.
+            self._clear_pending(key, run)
+
+    def _clear_pending(self, key: str, run: Followup) -> None:
+        if self._pending.get(key) is run:
+            del self._pending[key]
+
+    async def _call(
+        self,
+        run: Followup,
+        agent_meta: AgentMetadata,
+        context: Dict[str, Any],
+        custom_input: Optional[Dict[str, Any]],
+    ) -> None:
+        run.status = "running"
+        run.started_at = _now()
+        run.record("started", {"triggers": run.triggers})
+        try:
+            run.result = await call_agent(agent_meta, run.intent, "", context, custom_input=custom_input)
+            run.status = "done" if run.result.status == "success" else "error"
+            if run.status == "done":
+                tasks_proxy.invalidate_for(agent_meta.name)
+        except asyncio.CancelledError:
+            logger.warning("Follow-up %s (%s) was cancelled", run.followup_id, agent_meta.name)
+            run.status = "error"
+            raise
+        except Exception as exc:
+            logger.error("Follow-up %s (%s) failed: %s", run.followup_id, agent_meta.name, exc)
+            run.status = "error"
+        finally:
+            run.finished_at = _now()
+            run.record(run.status, {"agent_status": run.result.status if run.result else None})
+
+    def get(self, followup_id: str) -> Optional[Followup]:
+        return self._runs.get(followup_id)
+
+    def recent(
+        self,
+        limit: int = 20,
+        conversation_id: Optional[str] = None,
+        intent: Optional[str] = None,
+    ) -> List[Followup]:
+        """
+        Most recent follow-ups first, optionally for one conversation and/or
+        intent. Conversation-scoped runs (late results) are only listed when
+        their conversation_id is given.
+        """
+        runs = [
+            run for run in reversed(self._runs.values())
+            if (conversation_id in run.conversation_ids if conversation_id is not None else not run.scoped)
+            and (intent is None or run.intent == intent)
+        ]
+        return runs[:max(0, limit)]
+
+
+followup_manager = FollowupManager()
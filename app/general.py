@@ -8,6 +8,8 @@ import re
 from datetime import datetime, timezone
 from typing import Literal, Optional, TypedDict
 
+from . import metrics
+
 
 class GeneralOutcome(TypedDict):
     kind: Literal["blocked", "general", "none"]
@@ -26,10 +28,42 @@ ABUSE_PATTERNS = [
     r"\bmurder\b",
 ]
 
+# Pre-routing rules in priority order: (name, kind, pattern). Each pattern is a
+# lookahead so all rules compile into one anchored alternation; the first rule
+# that matches anywhere in the lowercased query wins, in a single regex call.
+_RULES = [
+    ("abuse", "blocked", r"(?=.*?(?:%s))" % "|".join(ABUSE_PATTERNS)),
+    ("greeting", "general", r"(?=.*?\b(?:hi|hello|hey|good (?:morning|afternoon|evening))\b)"),
+    ("how_are_you", "general", r"(?=.*?(?:how are you|how are u|how's it going))"),
+    ("who_are_you", "general", r"(?=.*?(?:who are you|who r u|what are you))"),
+    ("date", "general", r"(?=.*?(?:date|day))(?=.*?(?:today|current|what))"),
+    ("time", "general", r"(?=.*?time)(?=.*?(?:now|current|what))"),
+]
+_COMPILED_RULES = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, _, pattern in _RULES),
+    re.DOTALL,
+)
+_RULE_KINDS = {name: kind for name, kind, _ in _RULES}
+_CANNED_ANSWERS = {
+    "abuse": "I can't help with that.",
+    "greeting": "Hello! I'm here to help with your requests.",
+    "how_are_you": "I'm doing great, thank you for asking! How can I assist you today?",
+    "who_are_you": "I'm a supervisor agent that coordinates specialized worker agents to help you with various tasks like knowledge retrieval, scheduling, email management, and more.",
+}
+
+
+def _answer(rule: str) -> str:
+    if rule == "date":
+        return f"Today's date (UTC) is {datetime.now(timezone.utc).date().isoformat()}."
+    if rule == "time":
+        return f"The current time is {datetime.now(timezone.utc).strftime('%H:%M UTC')}."
+    return _CANNED_ANSWERS[rule]
 
-def _contains_abuse(text: str) -> bool:
-    lower = text.lower()
-    return any(re.search(pattern, lower) for pattern in ABUSE_PATTERNS)
+
+def match_general_rule(query: str) -> Optional[str]:
+    """Name of the highest-priority pre-routing rule matching ``query``, or None."""
+    match = _COMPILED_RULES.match(query.strip().lower())
+    return match.lastgroup if match else None
 
 
 def handle_general_query(query: str) -> GeneralOutcome:
@@ -37,31 +71,8 @@ def handle_general_query(query: str) -> GeneralOutcome:
     Handle greetings, well-being checks, date/time questions, and abusive text.
     Returns a structured outcome to let the server short-circuit agent calls.
     """
-    normalized = query.strip()
-    lower = normalized.lower()
-
-    if not normalized:
+    rule = match_general_rule(query)
+    if rule is None:
         return {"kind": "none", "answer": None}
-
-    if _contains_abuse(lower):
-        return {"kind": "blocked", "answer": "I can't help with that."}
-
-    greetings = [r"\bhi\b", r"\bhello\b", r"\bhey\b", r"\bgood (morning|afternoon|evening)\b"]
-    if any(re.search(pat, lower) for pat in greetings):
-        return {"kind": "general", "answer": "Hello! I'm here to help with your requests."}
-
-    if "how are you" in lower or "how are u" in lower or "how's it going" in lower:
-        return {"kind": "general", "answer": "I'm doing great, thank you for asking! How can I assist you today?"}
-
-    if "who are you" in lower or "who r u" in lower or "what are you" in lower:
-        return {"kind": "general", "answer": "I'm a supervisor agent that coordinates specialized worker agents to help you with various tasks like knowledge retrieval, scheduling, email management, and more."}
-
-    if ("date" in lower or "day" in lower) and ("today" in lower or "current" in lower or "what" in lower):
-        today = datetime.now(timezone.utc).date().isoformat()
-        return {"kind": "general", "answer": f"Today's date (UTC) is {today}."}
-
-    if "time" in lower and ("now" in lower or "current" in lower or "what" in lower):
-        current_time = datetime.now(timezone.utc).strftime("%H:%M UTC")
-        return {"kind": "general", "answer": f"The current time is {current_time}."}
-
-    return {"kind": "none", "answer": None}
\ No newline at end of file
+    metrics.incr(f"general_rule_{rule}")
+    return {"kind": _RULE_KINDS[rule], "answer": _answer(rule)}
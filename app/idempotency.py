@@ -0,0 +1,117 @@
+"""
+Idempotency-Key support for /api/query, so client retries do not re-run a plan
+(and its mutating calls such as create_task or onboarding.create).
+
+The first request with a key starts the run as a task owned by this store,
+not by its HTTP request. A duplicate that arrives while the run is in flight
+waits for the same task. A duplicate that arrives later, within the TTL, gets
+the stored response. Because the run is not tied to one client, it is not
+cancelled when that client disconnects; that is what lets a retry pick up the
+result. A failed run is forgotten, so the next retry executes again.
+
+Keys are scoped per client. Reusing a key with a different request body is
+rejected. State is in-memory and per-process, like the job store.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Awaitable, Callable, Dict, Tuple
+
+from . import metrics
+from .models import FrontendRequest, SupervisorResponse
+from .pipeline import DISCONNECT_POLL_SECONDS, ClientDisconnected
+from .ttl_cache import TTLCache
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1000"))
+# Longest accepted Idempotency-Key header value.
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is reused with a different request payload."""
+
+
+def fingerprint(payload: FrontendRequest) -> str:
+    raw = json.dumps(payload.dict(), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """In-flight runs and completed responses by (client, Idempotency-Key)."""
+
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # {key: (fingerprint, running task)}
+        self._inflight: Dict[str, Tuple[str, asyncio.Task]] = {}
+        # {key: (fingerprint, response)} for completed runs.
+        self._completed: TTLCache[str, Tuple[str, SupervisorResponse]] = TTLCache(max_entries, ttl_seconds)
+
+    def _store(self, key: str, digest: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key, (None, None))[1] is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._completed.put(key, (digest, task.result()))
+
+    async def execute(
+        self,
+        key: str,
+        payload: FrontendRequest,
+        run: Callable[[], Awaitable[SupervisorResponse]],
+        is_disconnected: Callable[[], Awaitable[bool]],
+    ) -> Tuple[SupervisorResponse, bool]:
+        """
+        Run ``run()`` at most once per key; returns (response, replayed).
+        Raises ClientDisconnected if this caller goes away (the run continues)
+        and IdempotencyConflict if the key was used for another payload.
+        """
+        digest = fingerprint(payload)
+        stored = self._completed.get(key)
+        if stored is not None:
+            if stored[0] != digest:
+                metrics.incr("idempotency_conflicts")
+                raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+            metrics.incr("idempotency_replayed")
+            return stored[1], True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if inflight[0] != digest:
+                metrics.incr("idempotency_conflicts")
+                raise IdempotencyConflict("Idempotency-Key is in use by a different request")
+            metrics.incr("idempotency_attached")
+            task, replayed = inflight[1], True
+        else:
+            metrics.incr("idempotency_executed")
+            task, replayed = asyncio.ensure_future(run()), False
+            self._inflight[key] = (digest, task)
+            task.add_done_callback(lambda done: self._store(key, digest, done))
+
+        while True:
+            # asyncio.wait never cancels the task, so a caller giving up leaves the run going.
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result(), replayed
+            if await is_disconnected():
+                metrics.incr("idempotency_waiter_disconnected")
+                raise ClientDisconnected()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "inflight": len(self._inflight),
+            "completed": len(self._completed),
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+            "executed": metrics.get_counter("idempotency_executed"),
+            "attached": metrics.get_counter("idempotency_attached"),
+            "replayed": metrics.get_counter("idempotency_replayed"),
+            "conflicts": metrics.get_counter("idempotency_conflicts"),
+        }
+
+
+idempotency_store = IdempotencyStore()
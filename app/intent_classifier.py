@@ -0,0 +1,272 @@
+"""
+Local intent classifier: an LLM-free routing stage between the keyword
+heuristics and the LLM planner. A TF-IDF index over word unigrams and
+character trigrams is built from each agent's description, intent names and a
+few labeled example queries; a query is routed when its best cosine match is
+confident and clearly ahead of the runner-up, otherwise it defers to the LLM.
+
+Only an agent's ``read_only_intents`` are ever routed without the LLM. Intents
+that write (create_task, onboarding.create, ...) stay in the index so they
+still compete for the top score, but a query whose best match is one of them
+always defers to the LLM planner: a wrong guess there creates data.
+
+Scoring is one matrix-vector product with NumPy (a matrix-matrix product for
+batches); without NumPy a sparse pure-Python dot product is used instead.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None  # optional; falls back to sparse dot products
+
+from . import metrics
+from .models import AgentMetadata, Plan, PlanStep
+
+logger = logging.getLogger(__name__)
+
+INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() in {"1", "true", "yes"}
+INTENT_CLASSIFIER_MIN_SCORE = float(os.getenv("INTENT_CLASSIFIER_MIN_SCORE", "0.22"))
+INTENT_CLASSIFIER_MIN_MARGIN = float(os.getenv("INTENT_CLASSIFIER_MIN_MARGIN", "0.08"))
+
+Label = Tuple[str, str]  # (agent, intent)
+
+# Labeled examples per routable intent. Aliases (e.g. add_task vs create_task)
+# are left out so they don't split the score of their canonical intent.
+LABELED_EXAMPLES: Dict[Label, List[str]] = {
+    ("progress_accountability_agent", "progress.track"): [
+        "how am I tracking against my goals",
+        "track my progress this week",
+        "am I on track with my tasks",
+    ],
+    ("email_priority_agent", "email.priority.classify"): [
+        "classify the priority of this email",
+        "is this email urgent",
+        "which of these emails should I answer first",
+        "prioritize my inbox messages",
+    ],
+    ("document_summarizer_agent", "summary.create"): [
+        "give me a short overview of this document",
+        "tl;dr of the attached file",
+        "what are the key points of this report",
+        "boil this text down to a few sentences",
+    ],
+    ("meeting_followup_agent", "meeting.followup"): [
+        "process the transcript from today's standup",
+        "who owns what after the sprint meeting",
+        "extract action items from the meeting notes",
+        "what did we agree on in the call",
+    ],
+    ("onboarding_buddy_agent", "onboarding.create"): [
+        "set up accounts for our new engineer",
+        "create credentials for a new team member starting monday",
+        "welcome a new staff member and create their email",
+    ],
+    ("onboarding_buddy_agent", "onboarding.check_progress"): [
+        "has the new hire finished their profile",
+        "which employees have incomplete profiles",
+        "is the new team member fully set up",
+    ],
+    ("KnowledgeBaseBuilderAgent", "create_task"): [
+        "remind me to write the quarterly report by friday",
+        "put prepare slides for the demo on my todo list",
+        "track a todo to migrate the database next week",
+    ],
+    ("task_dependency_agent", "task.resolve_dependencies"): [
+        "which tasks are blocked by other tasks",
+        "what order should I do my tasks in",
+        "resolve dependencies between my tasks",
+    ],
+    ("productivity_agent", "productivity.report"): [
+        "how productive was I last week",
+        "show my productivity report",
+        "how did I spend my focus time",
+    ],
+    ("productivity_agent", "goal.create"): [
+        "set a goal to read twelve books this year",
+        "I want to start a goal of running every morning",
+    ],
+    ("deadline_guardian_agent", "deadline.monitor"): [
+        "which deliverables are running late",
+        "are we going to ship the release on time",
+        "what is overdue this sprint",
+    ],
+    ("budget_tracker_agent", "budget.check"): [
+        "how much money is left for marketing",
+        "are we over on the cloud bill",
+        "what did we spend on contractors",
+        "show the finances for project apollo",
+    ],
+}
+
+_WORD = re.compile(r"[a-z][a-z0-9]+")
+_STOPWORDS = {
+    "the", "and", "for", "with", "from", "into", "that", "this", "are", "was", "can",
+    "only", "when", "what", "how", "my", "our", "your", "you", "its", "via", "per",
+    "please", "me", "is", "of", "to", "in", "on", "a", "an", "it", "do", "does", "use",
+}
+
+
+def _features(text: str) -> Counter:
+    """Word unigrams plus in-word character trigrams (robust to inflections/typos)."""
+    feats: Counter = Counter()
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        feats["w:" + word] += 1
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            feats["c:" + padded[i:i + 3]] += 1
+    return feats
+
+
+def _label_document(agent: AgentMetadata, intent: str) -> str:
+    intent_words = re.sub(r"[._]", " ", intent)
+    examples = " ".join(LABELED_EXAMPLES.get((agent.name, intent), []))
+    # Intent words and examples carry the signal that tells an agent's intents apart.
+    return f"{intent_words} {intent_words} {examples} {agent.description}"
+
+
+class _Index:
+    """TF-IDF vectors for every routable (agent, intent) label."""
+
+    def __init__(self, registry: List[AgentMetadata]):
+        self.labels: List[Label] = []
+        # Parallel to ``labels``: True when the intent is read-only (routable).
+        self.routable: List[bool] = []
+        docs: List[Counter] = []
+        for agent in registry:
+            for intent in agent.intents:
+                if (agent.name, intent) in LABELED_EXAMPLES:
+                    self.labels.append((agent.name, intent))
+                    self.routable.append(intent in agent.read_only_intents)
+                    docs.append(_features(_label_document(agent, intent)))
+
+        doc_freq: Counter = Counter()
+        for doc in docs:
+            doc_freq.update(doc.keys())
+        total = len(docs)
+        self.vocab: Dict[str, int] = {feat: i for i, feat in enumerate(sorted(doc_freq))}
+        self.idf: Dict[str, float] = {feat: math.log((1 + total) / (1 + df)) + 1.0 for feat, df in doc_freq.items()}
+
+        rows = [self._weigh(doc) for doc in docs]
+        self.matrix = None
+        # Without NumPy, score through per-feature postings so only the
+        # query's own features are visited.
+        self.postings: Dict[int, List[Tuple[int, float]]] = {}
+        if np is not None and self.labels:
+            self.matrix = np.zeros((len(self.labels), len(self.vocab)), dtype=np.float32)
+            for r, row in enumerate(rows):
+                for col, weight in row.items():
+                    self.matrix[r, col] = weight
+        else:
+            for r, row in enumerate(rows):
+                for col, weight in row.items():
+                    self.postings.setdefault(col, []).append((r, weight))
+
+    def _weigh(self, feats: Counter) -> Dict[int, float]:
+        """L2-normalized sublinear TF-IDF over known features."""
+        vec = {
+            self.vocab[feat]: (1.0 + math.log(count)) * self.idf[feat]
+            for feat, count in feats.items()
+            if feat in self.vocab
+        }
+        norm = math.sqrt(sum(w * w for w in vec.values()))
+        return {col: w / norm for col, w in vec.items()} if norm else {}
+
+    def scores(self, texts: List[str]) -> List[List[float]]:
+        """Cosine similarity of each text against every label."""
+        vectors = [self._weigh(_features(text)) for text in texts]
+        if self.matrix is not None:
+            queries = np.zeros((len(texts), len(self.vocab)), dtype=np.float32)
+            for r, vec in enumerate(vectors):
+                for col, weight in vec.items():
+                    queries[r, col] = weight
+            return (queries @ self.matrix.T).tolist()
+        results = []
+        for vec in vectors:
+            scores = [0.0] * len(self.labels)
+            for col, weight in vec.items():
+                for r, label_weight in self.postings.get(col, ()):
+                    scores[r] += weight * label_weight
+            results.append(scores)
+        return results
+
+
+class IntentClassifier:
+    """Registry-aware wrapper that rebuilds the index when the registry changes."""
+
+    def __init__(
+        self,
+        enabled: bool = INTENT_CLASSIFIER_ENABLED,
+        min_score: float = INTENT_CLASSIFIER_MIN_SCORE,
+        min_margin: float = INTENT_CLASSIFIER_MIN_MARGIN,
+    ):
+        self.enabled = enabled
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self._index: Optional[_Index] = None
+        self._version: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    def warm(self, registry: List[AgentMetadata]) -> None:
+        """Build the index ahead of the first query (called at startup)."""
+        self._get_index(registry)
+
+    def _get_index(self, registry: List[AgentMetadata]) -> _Index:
+        # Only names, descriptions and intents feed the index; comparing them is
+        # much cheaper than hashing the whole registry on every query.
+        version = tuple((a.name, a.description, tuple(a.intents), tuple(a.read_only_intents)) for a in registry)
+        with self._lock:
+            if self._index is None or self._version != version:
+                self._index = _Index(registry)
+                self._version = version
+                logger.info(
+                    "Intent classifier index built: %d labels, %d features (numpy=%s)",
+                    len(self._index.labels),
+                    len(self._index.vocab),
+                    np is not None,
+                )
+            return self._index
+
+    def _decide(self, index: _Index, scores: List[float]) -> Optional[Plan]:
+        ranked = sorted(zip(scores, range(len(scores))), reverse=True)
+        if not ranked:
+            return None
+        best_score, best = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        if best_score < self.min_score or best_score - runner_up < self.min_margin:
+            return None
+        if not index.routable[best]:
+            # Write intents always go through the LLM planner.
+            metrics.incr("intent_classifier_deferred_write")
+            return None
+        agent, intent = index.labels[best]
+        return Plan(steps=[PlanStep(step_id=0, agent=agent, intent=intent, input_source="user_query")])
+
+    def classify_many(self, queries: List[str], registry: List[AgentMetadata]) -> List[Optional[Plan]]:
+        """Route a batch of queries with one scoring pass; None where not confident."""
+        if not self.enabled or not queries:
+            return [None] * len(queries)
+        index = self._get_index(registry)
+        return [self._decide(index, scores) for scores in index.scores(queries)]
+
+    def best_score(self, query: str, registry: List[AgentMetadata]) -> float:
+        """Top cosine score for ``query``, whether or not it is confident enough to route."""
+        index = self._get_index(registry)
+        return max(index.scores([query])[0], default=0.0)
+
+    def classify(self, query: str, registry: List[AgentMetadata]) -> Optional[Plan]:
+        """Single-step plan for ``query`` when confident, else None (defer to the LLM)."""
+        return self.classify_many([query], registry)[0]
+
+
+intent_classifier = IntentClassifier()
@@ -0,0 +1,145 @@
+"""
+Async job mode for long-running queries. A job is accepted immediately, queued
+for a bounded pool of background workers that run the normal query pipeline,
+and records per-step progress events plus the final SupervisorResponse so
+clients can poll or stream instead of holding an HTTP request open.
+
+State is in-memory and per-process, like the conversation store.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from .admission import admission
+from .models import ErrorModel, FrontendRequest, JobInfo, SupervisorResponse
+from .pipeline import run_query
+from .rate_limit import RateLimited, bound_client_key, client_key
+from .streaming import EventLog
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "900"))
+# Jobs exist for slow agents, so they get a longer default budget than /api/query.
+JOB_DEADLINE_MS = int(os.getenv("JOB_DEADLINE_MS", "300000"))
+
+
+class JobQueueFull(Exception):
+    """Raised when the pending-job queue is at capacity."""
+
+
+class Job(EventLog):
+    """A single queued/running query plus its recorded progress."""
+
+    def __init__(self, payload: FrontendRequest):
+        super().__init__()
+        self.job_id = str(uuid.uuid4())
+        self.payload = payload
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at: Optional[float] = None
+        self.result: Optional[SupervisorResponse] = None
+        self.error: Optional[ErrorModel] = None
+        # Rate-limit key of the submitting request; the worker runs without it.
+        self.client_key = client_key(payload.user_id)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in {"done", "error"}
+
+    def info(self) -> JobInfo:
+        return JobInfo(
+            job_id=self.job_id,
+            status=self.status,
+            created_at=self.created_at,
+            events=list(self.events),
+            result=self.result,
+            error=self.error,
+        )
+
+
+class JobManager:
+    """Bounded worker pool draining an in-memory job queue."""
+
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        """Start workers lazily on the running loop (restarting if the loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker_tasks = [loop.create_task(self._worker(self._queue)) for _ in range(self.workers)]
+        return self._queue
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            job: Job = await queue.get()
+            try:
+                await self._run(job)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.record("started", {})
+        try:
+            # Jobs count against their lane like interactive queries, but wait for a slot.
+            async with admission.admit(admission.classify(job.payload.query), wait=True):
+                with bound_client_key(job.client_key):
+                    job.result = await run_query(job.payload, on_event=job.record)
+            job.status = "done"
+            job.record("done", {"answer": job.result.answer})
+        except RateLimited as exc:
+            job.error = ErrorModel(type="rate_limited", message=str(exc))
+            job.status = "error"
+            job.record("error", job.error.dict())
+        except Exception as exc:
+            logger.error("Job %s failed: %s", job.job_id, exc)
+            job.error = ErrorModel(type="internal_error", message=str(exc))
+            job.status = "error"
+            job.record("error", job.error.dict())
+        finally:
+            job.finished_at = time.monotonic()
+
+    def _prune(self) -> None:
+        """Drop finished jobs older than the TTL."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [jid for jid, job in self._jobs.items() if job.finished_at is not None and job.finished_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def submit(self, payload: FrontendRequest) -> Job:
+        """Queue a query for background execution; raises JobQueueFull at capacity."""
+        self._prune()
+        queue = self._ensure_workers()
+        if payload.options.deadline_ms is None and JOB_DEADLINE_MS > 0:
+            payload = payload.copy(update={"options": payload.options.copy(update={"deadline_ms": JOB_DEADLINE_MS})})
+        job = Job(payload)
+        try:
+            queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Job queue is full ({self.max_pending} pending)")
+        self._jobs[job.job_id] = job
+        job.record("queued", {"position": queue.qsize()})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+
+job_manager = JobManager()
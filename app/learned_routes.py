@@ -0,0 +1,206 @@
+"""
+Routing rules learned from LLM planner decisions. Every successful single-step
+LLM plan is logged as (query n-grams -> agent/intent). Periodically, n-grams
+seen often enough that almost always led to the same agent/intent are promoted
+into a local routing table that the pipeline consults before calling the LLM.
+
+Promoted rules can be reviewed and exported via the admin API, individually
+rejected, and the whole table switched off at runtime (kill switch). New rules
+stay "proposed" until approved (LEARNED_ROUTES_REQUIRE_REVIEW, on by default).
+With review off, only rules for read-only intents activate on their own; rules
+for intents that write still wait for an admin.
+
+A query is routed only when at least LEARNED_ROUTES_MIN_MATCHES active rules
+match it, at least one of them a bigram, and they all agree. A single common
+word such as "task" never routes a query by itself.
+
+State is in-memory and per-process, like the conversation store.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from . import metrics
+from .models import AgentMetadata, Plan, PlanStep
+from .plan_cache import normalize_query
+
+LEARNED_ROUTES_ENABLED = os.getenv("LEARNED_ROUTES_ENABLED", "true").lower() in {"1", "true", "yes"}
+LEARNED_ROUTES_REQUIRE_REVIEW = os.getenv("LEARNED_ROUTES_REQUIRE_REVIEW", "true").lower() in {"1", "true", "yes"}
+LEARNED_ROUTES_MIN_SUPPORT = int(os.getenv("LEARNED_ROUTES_MIN_SUPPORT", "5"))
+LEARNED_ROUTES_MIN_CONFIDENCE = float(os.getenv("LEARNED_ROUTES_MIN_CONFIDENCE", "0.9"))
+LEARNED_ROUTES_PROMOTE_SECONDS = float(os.getenv("LEARNED_ROUTES_PROMOTE_SECONDS", "300"))
+# Distinct active n-grams (at least one a bigram) a query must match to be routed.
+LEARNED_ROUTES_MIN_MATCHES = int(os.getenv("LEARNED_ROUTES_MIN_MATCHES", "2"))
+
+# Where each plan came from; used for the LLM-share report.
+PLAN_SOURCES = ("heuristic", "cache", "learned", "classifier", "llm")
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "to", "of", "for", "in", "on", "at", "is", "are",
+    "me", "my", "i", "we", "our", "you", "your", "it", "this", "that", "please",
+    "can", "could", "would", "what", "how", "do", "does", "with",
+}
+_DIGITS = re.compile(r"\d+")
+
+Route = Tuple[str, str]  # (agent, intent)
+
+
+def query_ngrams(query: str) -> Set[str]:
+    """Unigrams and bigrams of the normalized query, stopwords and numbers removed."""
+    words = [w for w in _DIGITS.sub(" ", normalize_query(query)).split() if w not in _STOPWORDS]
+    grams = set(words)
+    grams.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return grams
+
+
+def record_plan_source(source: str) -> None:
+    """Count how a plan was produced (see PLAN_SOURCES)."""
+    metrics.incr(f"plan_source_{source}")
+
+
+def plan_source_report() -> Dict[str, Any]:
+    """Share of planned queries per source, including the LLM share."""
+    counts = {source: int(metrics.get_counter(f"plan_source_{source}")) for source in PLAN_SOURCES}
+    total = sum(counts.values())
+    return {
+        "counts": counts,
+        "total": total,
+        "llm_share": round(counts["llm"] / total, 4) if total else 0.0,
+    }
+
+
+class LearnedRouter:
+    """Observation log plus the promoted n-gram routing table."""
+
+    def __init__(
+        self,
+        enabled: bool = LEARNED_ROUTES_ENABLED,
+        require_review: bool = LEARNED_ROUTES_REQUIRE_REVIEW,
+        min_support: int = LEARNED_ROUTES_MIN_SUPPORT,
+        min_confidence: float = LEARNED_ROUTES_MIN_CONFIDENCE,
+        promote_seconds: float = LEARNED_ROUTES_PROMOTE_SECONDS,
+        min_matches: int = LEARNED_ROUTES_MIN_MATCHES,
+    ):
+        self.enabled = enabled
+        self.require_review = require_review
+        self.min_support = max(1, min_support)
+        self.min_confidence = min_confidence
+        self.promote_seconds = promote_seconds
+        self.min_matches = max(1, min_matches)
+        self._observations: Dict[str, Counter] = defaultdict(Counter)
+        # Routes seen so far and whether their intent is read-only.
+        self._read_only: Dict[Route, bool] = {}
+        self._rules: Dict[str, Dict[str, Any]] = {}
+        self._last_promotion = time.monotonic()
+        self._lock = threading.Lock()
+
+    def observe(self, query: str, plan: Plan, registry: List[AgentMetadata]) -> None:
+        """Log a successful LLM plan; only single-step plans are learnable."""
+        if len(plan.steps) != 1:
+            return
+        route: Route = (plan.steps[0].agent, plan.steps[0].intent)
+        read_only = any(a.name == route[0] and route[1] in a.read_only_intents for a in registry)
+        with self._lock:
+            self._read_only[route] = read_only
+            for gram in query_ngrams(query):
+                self._observations[gram][route] += 1
+            due = time.monotonic() - self._last_promotion >= self.promote_seconds
+        if due:
+            self.promote()
+
+    def promote(self) -> int:
+        """Promote frequent, consistent n-grams into rules; returns how many are new."""
+        added = 0
+        with self._lock:
+            self._last_promotion = time.monotonic()
+            for gram, routes in self._observations.items():
+                support = sum(routes.values())
+                (agent, intent), top = routes.most_common(1)[0]
+                confidence = top / support
+                rule = self._rules.get(gram)
+                if support < self.min_support or confidence < self.min_confidence:
+                    # A once-good rule whose evidence degraded stops routing.
+                    if rule is not None and rule["status"] == "active":
+                        rule["status"] = "proposed"
+                    continue
+                if rule is not None and rule["status"] == "rejected":
+                    continue
+                auto_status = "active" if self._auto_activates((agent, intent)) else "proposed"
+                if rule is None:
+                    added += 1
+                    status = auto_status
+                elif (rule["agent"], rule["intent"]) != (agent, intent):
+                    status = auto_status
+                else:
+                    status = rule["status"]
+                self._rules[gram] = {
+                    "ngram": gram,
+                    "agent": agent,
+                    "intent": intent,
+                    "support": support,
+                    "confidence": round(confidence, 4),
+                    "status": status,
+                }
+        metrics.incr("learned_routes_promoted", added)
+        return added
+
+    def _auto_activates(self, route: Route) -> bool:
+        # Write intents are never activated without review: a wrong rule creates data.
+        return not self.require_review and self._read_only.get(route, False)
+
+    def route(self, query: str, registry: List[AgentMetadata]) -> Optional[Plan]:
+        """
+        Plan from active rules when enough of them match (one a bigram) and
+        they all agree; otherwise None.
+        """
+        if not self.enabled:
+            return None
+        grams = query_ngrams(query)
+        matched: List[str] = []
+        matches: Set[Route] = set()
+        with self._lock:
+            for gram in grams:
+                rule = self._rules.get(gram)
+                if rule is not None and rule["status"] == "active":
+                    matched.append(gram)
+                    matches.add((rule["agent"], rule["intent"]))
+        if len(matches) != 1 or len(matched) < self.min_matches or not any(" " in gram for gram in matched):
+            return None
+        agent, intent = matches.pop()
+        # Rules may outlive registry edits; only route to intents that still exist.
+        if not any(a.name == agent and intent in a.intents for a in registry):
+            return None
+        return Plan(steps=[PlanStep(step_id=0, agent=agent, intent=intent, input_source="user_query")])
+
+    def set_status(self, ngram: str, status: str) -> Optional[Dict[str, Any]]:
+        """Review a rule: mark it active, proposed or rejected."""
+        with self._lock:
+            rule = self._rules.get(ngram)
+            if rule is not None:
+                rule["status"] = status
+                return dict(rule)
+        return None
+
+    def export(self) -> Dict[str, Any]:
+        """Rules and settings for review."""
+        with self._lock:
+            rules = sorted((dict(r) for r in self._rules.values()), key=lambda r: (-r["support"], r["ngram"]))
+            observed = len(self._observations)
+        return {
+            "enabled": self.enabled,
+            "require_review": self.require_review,
+            "min_support": self.min_support,
+            "min_confidence": self.min_confidence,
+            "min_matches": self.min_matches,
+            "observed_ngrams": observed,
+            "rules": rules,
+            "plan_sources": plan_source_report(),
+        }
+
+
+learned_router = LearnedRouter()
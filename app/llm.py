@@ -0,0 +1,252 @@
+"""
+Shared async LLM gateway used by the planner, answer synthesis and history
+summaries. It owns the pooled client, global and per-purpose concurrency
+limits, retries with jittered backoff on 429/5xx/timeouts, and per-call
+latency and token metrics, so every LLM-facing performance knob lives here.
+
+The backend is pluggable: ``LLM_BASE_URL`` points the OpenAI-compatible
+backend at any server (e.g. scripts/fake_llm_server.py for benchmarks), and
+``set_backend`` swaps in an in-process implementation for tests.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+try:
+    from openai import AsyncOpenAI  # type: ignore
+except ImportError:
+    AsyncOpenAI = None  # optional; callers fall back to heuristics/stitching
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Per-purpose caps, e.g. LLM_CONCURRENCY_PLANNER=8 (default: the global cap).
+LLM_PURPOSES = ("planner", "answer", "summary")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+# Per-attempt timeout for calls made without a deadline (0 = the SDK's default).
+LLM_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("LLM_DEFAULT_TIMEOUT_SECONDS", "60"))
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """Raised when no LLM backend is configured (no SDK or API key)."""
+
+
+@dataclass
+class LLMResult:
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+
+
+class LLMBackend(ABC):
+    """Interface for chat-completion backends."""
+
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def complete(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float], **kwargs: Any) -> LLMResult:
+        """One chat completion within ``timeout`` seconds (None: the backend's default)."""
+
+    @abstractmethod
+    def stream(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float]) -> AsyncIterator[str]:
+        """Text deltas of one chat completion, as an async iterator."""
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """OpenRouter (or any OpenAI-compatible server) through one pooled async client."""
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: Optional[str] = None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _key(self) -> Optional[str]:
+        return self.api_key or os.getenv("OPENROUTER_API_KEY")
+
+    def available(self) -> bool:
+        return AsyncOpenAI is not None and bool(self._key())
+
+    def _get_client(self):
+        # The SDK's connection pool is bound to the loop it was created on.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if not self.available():
+                raise LLMUnavailable("OpenAI SDK or OPENROUTER_API_KEY missing")
+            # Retries are handled by the gateway so they share its backoff and metrics.
+            self._client = AsyncOpenAI(base_url=self.base_url, api_key=self._key(), max_retries=0)
+            self._loop = loop
+        return self._client
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float], **kwargs: Any) -> LLMResult:
+        if timeout is not None:
+            # An explicit timeout=None would disable the SDK's own default.
+            kwargs["timeout"] = timeout
+        response = await self._get_client().chat.completions.create(model=model, messages=messages, **kwargs)
+        content = response.choices[0].message.content if response.choices else ""
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        return LLMResult(
+            content=(content or "").strip(),
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            cached_prompt_tokens=getattr(details, "cached_tokens", 0) or 0,
+        )
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float]) -> AsyncIterator[str]:
+        options: Dict[str, Any] = {} if timeout is None else {"timeout": timeout}
+        chunks = await self._get_client().chat.completions.create(
+            model=model, messages=messages, stream=True, **options
+        )
+        async for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in _RETRYABLE_STATUS
+    # SDK connection/timeout errors carry no status code.
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout"}
+
+
+class LLMGateway:
+    """Concurrency limits, retries and metrics around one backend."""
+
+    def __init__(self, backend: Optional[LLMBackend] = None, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.backend = backend or OpenAICompatibleBackend()
+        self.max_concurrency = max(1, max_concurrency)
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def available(self) -> bool:
+        return self.backend.available()
+
+    def _semaphores(self, purpose: str):
+        """Global and per-purpose semaphores for the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._limits = {"*": asyncio.Semaphore(self.max_concurrency)}
+        if purpose not in self._limits:
+            cap = int(os.getenv(f"LLM_CONCURRENCY_{purpose.upper()}", str(self.max_concurrency)))
+            self._limits[purpose] = asyncio.Semaphore(max(1, cap))
+        return self._limits["*"], self._limits[purpose]
+
+    async def _backoff(self, purpose: str, attempt: int, exc: BaseException, deadline_at: Optional[float]) -> bool:
+        """Sleep before the next attempt; False when out of retries or time."""
+        if attempt >= LLM_MAX_RETRIES or not _is_retryable(exc):
+            return False
+        delay = random.uniform(0, LLM_RETRY_BASE_SECONDS * (2 ** attempt))
+        if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+            return False
+        metrics.incr(f"llm_{purpose}_retries")
+        logger.warning("LLM %s call failed (%s); retrying in %.2fs", purpose, exc, delay)
+        await asyncio.sleep(delay)
+        return True
+
+    @staticmethod
+    def _timeout(deadline_at: Optional[float]) -> Optional[float]:
+        """Timeout for one attempt: the time left, capped by LLM_DEFAULT_TIMEOUT_SECONDS."""
+        cap = LLM_DEFAULT_TIMEOUT_SECONDS if LLM_DEFAULT_TIMEOUT_SECONDS > 0 else None
+        if deadline_at is None:
+            return cap
+        remaining = max(0.0, deadline_at - time.monotonic())
+        return min(remaining, cap) if cap is not None else remaining
+
+    async def complete(
+        self,
+        purpose: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        """One chat completion; ``timeout`` bounds all attempts together."""
+        if not self.available():
+            raise LLMUnavailable("No LLM backend configured")
+        deadline_at = None if timeout is None else time.monotonic() + timeout
+        global_limit, purpose_limit = self._semaphores(purpose)
+        attempt = 0
+        async with global_limit, purpose_limit:
+            while True:
+                started = time.perf_counter()
+                metrics.incr(f"llm_{purpose}_calls")
+                try:
+                    result = await self.backend.complete(model, messages, self._timeout(deadline_at), **kwargs)
+                except Exception as exc:
+                    metrics.incr(f"llm_{purpose}_errors")
+                    if not await self._backoff(purpose, attempt, exc, deadline_at):
+                        raise
+                    attempt += 1
+                    continue
+                finally:
+                    metrics.observe(f"llm_{purpose}_latency_ms", (time.perf_counter() - started) * 1000)
+                metrics.incr(f"llm_{purpose}_prompt_tokens", result.prompt_tokens)
+                metrics.incr(f"llm_{purpose}_completion_tokens", result.completion_tokens)
+                metrics.incr(f"llm_{purpose}_cached_prompt_tokens", result.cached_prompt_tokens)
+                return result
+
+    async def stream(
+        self,
+        purpose: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """Stream text deltas; retried only if the failure happens before the first delta."""
+        if not self.available():
+            raise LLMUnavailable("No LLM backend configured")
+        deadline_at = None if timeout is None else time.monotonic() + timeout
+        global_limit, purpose_limit = self._semaphores(purpose)
+        attempt = 0
+        async with global_limit, purpose_limit:
+            while True:
+                started = time.perf_counter()
+                metrics.incr(f"llm_{purpose}_calls")
+                emitted = False
+                try:
+                    async for delta in self.backend.stream(model, messages, self._timeout(deadline_at)):
+                        if not emitted:
+                            metrics.observe(f"llm_{purpose}_first_token_ms", (time.perf_counter() - started) * 1000)
+                            emitted = True
+                        yield delta
+                    return
+                except Exception as exc:
+                    metrics.incr(f"llm_{purpose}_errors")
+                    if emitted or not await self._backoff(purpose, attempt, exc, deadline_at):
+                        raise
+                    attempt += 1
+                finally:
+                    metrics.observe(f"llm_{purpose}_latency_ms", (time.perf_counter() - started) * 1000)
+
+
+_gateway = LLMGateway()
+
+
+def get_gateway() -> LLMGateway:
+    return _gateway
+
+
+def set_backend(backend: LLMBackend) -> None:
+    """Route every LLM call through ``backend`` (tests, benchmarks, fakes)."""
+    _gateway.backend = backend
@@ -0,0 +1,58 @@
+"""
+In-process metrics: named counters and latency/size observations with simple
+percentile summaries, exposed via /api/metrics. Per-process only; swap for a
+Prometheus/StatsD client when running multiple instances.
+"""
+from __future__ import annotations
+
+import threading
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict
+
+# Observations kept per series for percentile summaries.
+MAX_SAMPLES = 1000
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+
+def incr(name: str, amount: float = 1) -> None:
+    """Increase a counter (safe to call from worker threads)."""
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name: str, value: float) -> None:
+    """Record one observation, e.g. a latency in ms or a token count."""
+    with _lock:
+        _samples[name].append(value)
+
+
+def get_counter(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def _summarize(values: Deque[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    count = len(ordered)
+
+    def pct(p: float) -> float:
+        return ordered[min(count - 1, int(p * count))]
+
+    return {
+        "count": count,
+        "avg": round(sum(ordered) / count, 3),
+        "p50": round(pct(0.50), 3),
+        "p95": round(pct(0.95), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def snapshot() -> Dict[str, Any]:
+    """Current counters and per-series summaries."""
+    with _lock:
+        counters = dict(_counters)
+        series = {name: _summarize(values) for name, values in _samples.items() if values}
+    return {"counters": counters, "series": series}
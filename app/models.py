@@ -14,6 +14,11 @@ class FrontendOptions(BaseModel):
     """Flags that the UI can send along with a query."""
 
     debug: bool = False
+    # End-to-end time budget for this query; defaults to REQUEST_DEADLINE_MS.
+    deadline_ms: Optional[int] = Field(default=None, gt=0)
+    # Answer from finished steps after this long; slow steps complete in the
+    # background. Defaults to SOFT_DEADLINE_MS (0 = wait for every step).
+    soft_deadline_ms: Optional[int] = Field(default=None, ge=0)
 
 
 class FileUpload(BaseModel):
@@ -91,6 +96,11 @@ class AgentMetadata(BaseModel):
     command: Optional[str] = None
     healthcheck: Optional[str] = None
     timeout_ms: int = 5000
+    # Intents with no side effects; safe to call speculatively or retry.
+    read_only_intents: List[str] = Field(default_factory=list)
+    # How a single-agent answer is produced per intent: "passthrough" (output is
+    # already user-ready), "template" (render structured output) or LLM (default).
+    synthesis: Dict[str, str] = Field(default_factory=dict)
 
 
 class PlanStep(BaseModel):
@@ -107,5 +117,61 @@ class Plan(BaseModel):
 class SupervisorResponse(BaseModel):
     answer: str
     used_agents: List[UsedAgentEntry]
-    intermediate_results: Dict[str, Any]
+    # Per-step agent responses; filled only for debug requests. Otherwise
+    # fetch them from GET /api/requests/{request_id}.
+    intermediate_results: Dict[str, Any] = Field(default_factory=dict)
+    request_id: Optional[str] = None
     error: Optional[ErrorModel] = None
+    # Background follow-ups still producing results for this answer.
+    followup_ids: List[str] = Field(default_factory=list)
+
+
+class JobEvent(BaseModel):
+    """One progress event recorded while a background job runs."""
+
+    event: str
+    data: Dict[str, Any] = Field(default_factory=dict)
+    timestamp: str
+
+
+class JobInfo(BaseModel):
+    """Status snapshot of an async query job."""
+
+    job_id: str
+    status: str  # "queued", "running", "done" or "error"
+    created_at: str
+    events: List[JobEvent] = Field(default_factory=list)
+    result: Optional[SupervisorResponse] = None
+    error: Optional[ErrorModel] = None
+
+
+class BatchQueryRequest(BaseModel):
+    """Many queries submitted in one call to /api/query/batch."""
+
+    queries: List[FrontendRequest]
+
+
+class BatchItemResult(BaseModel):
+    """One NDJSON line of a batch response, emitted as each query completes."""
+
+    index: int
+    response: Optional[SupervisorResponse] = None
+    error: Optional[ErrorModel] = None
+
+
+class FollowupInfo(BaseModel):
+    """Status of a background follow-up (e.g. dependency resolution after create_task)."""
+
+    followup_id: str
+    agent: str
+    intent: str
+    status: str  # "pending", "running", "done" or "error"
+    triggers: int = 1
+    conversation_ids: List[str] = Field(default_factory=list)
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    events: List[JobEvent] = Field(default_factory=list)
+    result: Optional[AgentResponse] = None
+    # Updated answer pushed to the conversation when the follow-up completed.
+    answer: Optional[str] = None
@@ -0,0 +1,198 @@
+"""
+Tool-output reduction before answer synthesis. Agent outputs that fit their
+share of the token budget are passed through untouched. Larger ones are
+stripped of redundant fields (empty values, top-level bookkeeping keys,
+details that merely repeat the result) and cut down to the budget, keeping the
+sections most related to the query. Every cut is recorded so large outputs are
+visible in logs/metrics instead of silently turning into slow LLM calls.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from . import metrics
+from .conversation import estimate_tokens
+from .models import AgentResponse
+
+logger = logging.getLogger(__name__)
+
+# Total token budget for all tool outputs in the answer prompt.
+ANSWER_TOOL_OUTPUT_TOKENS = int(os.getenv("ANSWER_TOOL_OUTPUT_TOKENS", "1500"))
+
+# Bookkeeping fields agents echo back at the top level of their output. Nested
+# keys are data (e.g. a task's "status") and are never dropped by name.
+_NOISE_KEYS = {"success", "request_id", "timestamp", "status", "agent_name", "trace_id", "debug"}
+_WORD = re.compile(r"[a-z0-9]{3,}")
+
+
+def _compact(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _strip(value: Any, result_text: str = "", top: bool = True) -> Any:
+    """Drop empty values, top-level noise keys and copies of the result from structured data."""
+    if isinstance(value, dict):
+        cleaned = {}
+        for key, item in value.items():
+            if top and key in _NOISE_KEYS:
+                continue
+            item = _strip(item, result_text, top=False)
+            if item in (None, "", [], {}):
+                continue
+            if isinstance(item, str) and result_text and item.strip() == result_text:
+                continue
+            cleaned[key] = item
+        return cleaned
+    if isinstance(value, list):
+        return [item for item in (_strip(v, result_text, top=False) for v in value) if item not in (None, "", [], {})]
+    return value
+
+
+def _strip_details(details: Any, result: Any) -> Any:
+    """Details are often the raw response dumped as JSON; keep only what the result lacks."""
+    if not details:
+        return None
+    result_text = _compact(result).strip() if result is not None else ""
+    if isinstance(details, str):
+        if details.strip() == result_text:
+            return None
+        try:
+            details = json.loads(details)
+        except ValueError:
+            return details
+    return _strip(details, result_text) or None
+
+
+def _extract_relevant(text: str, query: str, budget_tokens: int) -> str:
+    """Keep the opening section plus the sections sharing most words with the query."""
+    budget_chars = max(0, budget_tokens * 4)
+    if len(text) <= budget_chars:
+        return text
+    sections = [s for s in re.split(r"\n\s*\n", text) if s.strip()]
+    query_words = set(_WORD.findall(query.lower()))
+    ranked = sorted(
+        range(1, len(sections)),
+        key=lambda i: -len(query_words & set(_WORD.findall(sections[i].lower()))),
+    )
+    keep = {0}
+    used = len(sections[0]) if sections else 0
+    for i in ranked:
+        if used + len(sections[i]) > budget_chars:
+            continue
+        keep.add(i)
+        used += len(sections[i])
+    reduced = "\n\n".join(sections[i] for i in sorted(keep))
+    if len(reduced) > budget_chars:
+        reduced = reduced[:budget_chars]
+    return f"{reduced}\n[... {len(text) - len(reduced)} chars omitted]"
+
+
+def _fit(value: Any, query: str, budget_tokens: int) -> Tuple[Any, str]:
+    """Bring one field under ``budget_tokens``; returns (value, action)."""
+    if value is None or estimate_tokens(_compact(value)) <= budget_tokens:
+        return value, "kept"
+    if isinstance(value, list):
+        kept: List[Any] = []
+        used = 0
+        for item in value:
+            used += estimate_tokens(_compact(item)) + 1
+            # Leave room for the "items omitted" marker.
+            if used + 8 > budget_tokens:
+                break
+            kept.append(item)
+        if kept:
+            return kept + [f"... {len(value) - len(kept)} more items omitted"], "truncated_list"
+    if isinstance(value, dict):
+        # Shrink the largest fields first so small, informative ones survive intact.
+        fitted = dict(value)
+        for key in sorted(fitted, key=lambda k: -estimate_tokens(_compact(fitted[k]))):
+            excess = estimate_tokens(_compact(fitted)) - budget_tokens
+            if excess <= 0:
+                break
+            size = estimate_tokens(_compact(fitted[key]))
+            if size - excess < 16:
+                del fitted[key]
+            else:
+                fitted[key], _ = _fit(fitted[key], query, size - excess)
+        if fitted and estimate_tokens(_compact(fitted)) <= budget_tokens * 1.1:
+            return fitted, "truncated_fields"
+    return _extract_relevant(_compact(value), query, budget_tokens), "extracted"
+
+
+def reduce_tool_outputs(
+    query: str,
+    step_outputs: Dict[int, AgentResponse],
+    budget_tokens: int = ANSWER_TOOL_OUTPUT_TOKENS,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Build compact tool findings for the answer prompt. Returns the findings and
+    a report with one entry per field that was stripped or cut.
+    """
+    findings: List[Dict[str, Any]] = []
+    report: List[Dict[str, Any]] = []
+    successful = [s for s in step_outputs.values() if s.is_success()]
+    # Each successful tool gets an equal share; within it the result comes
+    # first and details get whatever is left.
+    per_tool = max(1, budget_tokens // max(1, len(successful)))
+    before = after = 0
+
+    for response in step_outputs.values():
+        finding: Dict[str, Any] = {"agent": response.agent_name, "status": response.status}
+        if not response.is_success():
+            if response.error is not None:
+                finding["error"] = response.error.message
+            findings.append(finding)
+            continue
+
+        output = response.output
+        original = estimate_tokens(_compact(output.result)) + estimate_tokens(_compact(output.details or ""))
+        before += original
+        if original <= per_tool:
+            # Within budget: the LLM sees exactly what the agent returned.
+            finding["result"] = output.result
+            if output.details:
+                finding["details"] = output.details
+            if output.confidence is not None:
+                finding["confidence"] = output.confidence
+            after += original
+            findings.append(finding)
+            continue
+
+        result = _strip(output.result)
+        details = _strip_details(output.details, output.result)
+        if output.details and details is None:
+            report.append({"agent": response.agent_name, "field": "details", "action": "dropped_redundant"})
+
+        result, action = _fit(result, query, per_tool)
+        if action != "kept":
+            report.append({"agent": response.agent_name, "field": "result", "action": action})
+        remaining = per_tool - estimate_tokens(_compact(result))
+        if details is not None:
+            if remaining <= 0:
+                report.append({"agent": response.agent_name, "field": "details", "action": "dropped_budget"})
+                details = None
+            else:
+                details, action = _fit(details, query, remaining)
+                if action != "kept":
+                    report.append({"agent": response.agent_name, "field": "details", "action": action})
+
+        finding["result"] = result
+        if details is not None:
+            finding["details"] = details
+        if output.confidence is not None:
+            finding["confidence"] = output.confidence
+        reduced = estimate_tokens(_compact(result)) + estimate_tokens(_compact(details or ""))
+        after += reduced
+        if reduced < original:
+            report.append({"agent": response.agent_name, "tokens_before": original, "tokens_after": reduced})
+        findings.append(finding)
+
+    metrics.observe("answer_tool_tokens_before", before)
+    metrics.observe("answer_tool_tokens_after", after)
+    if report:
+        logger.info("Tool outputs reduced for answer synthesis (%s -> %s tokens): %s", before, after, report)
+    return findings, report
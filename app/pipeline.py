@@ -0,0 +1,441 @@
+"""
+End-to-end query pipeline shared by every entry point (sync endpoint, async
+jobs, batch, streaming). It wires general-query short-circuits, planning, execution and
+answer synthesis, and reports progress through an optional event callback so
+callers can surface per-stage updates without re-implementing the flow.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .answer import ANSWER_HISTORY_TOKENS, compose_final_answer, direct_answer
+from .conversation import append_turn, get_history_window
+from .deadline import Deadline
+from .executor import AgentLimiter, EventCallback, emit_event, execute_plan, execute_plan_soft
+from .followups import followup_manager
+from .file_utils import normalize_file_uploads
+from . import metrics
+from .general import GeneralOutcome, handle_general_query
+from .intent_classifier import intent_classifier
+from .learned_routes import learned_router, record_plan_source
+from .models import AgentMetadata, AgentResponse, ErrorModel, FrontendRequest, Plan, SupervisorResponse
+from .plan_cache import plan_cache
+from .planner import PLANNER_HISTORY_TOKENS, heuristic_plan, llm_plan
+from .rate_limit import RateLimited, client_key, rate_limiter
+from .registry import load_registry
+from .result_store import intermediate_results, result_store
+from .speculation import SPECULATIVE_DISPATCH, Speculation, start_speculation
+
+logger = logging.getLogger(__name__)
+
+# Answer from finished steps after this long (0 = wait for all steps).
+SOFT_DEADLINE_MS = int(os.getenv("SOFT_DEADLINE_MS", "0"))
+# How often a waiting request checks whether its client went away.
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+
+class ClientDisconnected(Exception):
+    """Raised when a query run was cancelled because its client went away."""
+
+
+@dataclass
+class PreparedQuery:
+    """Request state resolved before planning (uploads, history, short-circuit)."""
+
+    payload: FrontendRequest
+    conversation_id: str
+    # Token-budgeted history windows for the planner and for answer synthesis.
+    history: List[Dict[str, str]]
+    answer_history: List[Dict[str, str]]
+    query_text: str
+    file_uploads: List[Dict[str, Any]]
+    general: GeneralOutcome
+    context: Dict[str, Any]
+    deadline: Optional[Deadline] = None
+    speculation: Optional[Speculation] = None
+    # Where the plan came from: "heuristic", "cache", "learned", "classifier" or "llm".
+    plan_source: Optional[str] = None
+    # Stages ("plan", "agents", "answer") cut short by the request deadline.
+    timed_out: List[str] = field(default_factory=list)
+    # Key for this run's step outputs in the result store.
+    request_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+
+def prepare_query(payload: FrontendRequest) -> PreparedQuery:
+    """Resolve conversation, uploads and the general-query check for a request."""
+    # Start the clock before any work so every stage shares one budget.
+    deadline = Deadline.from_options(payload.options)
+    conversation_id = payload.conversation_id or str(uuid.uuid4())
+    history = get_history_window(conversation_id, PLANNER_HISTORY_TOKENS)
+    answer_history = get_history_window(conversation_id, ANSWER_HISTORY_TOKENS)
+
+    # Normalize file uploads: prefer structured field, fallback to query text parsing
+    structured_uploads = None
+    if payload.file_uploads:
+        # Convert Pydantic models to dicts for utility function
+        structured_uploads = [
+            {
+                'base64_data': fu.base64_data,
+                'filename': fu.filename,
+                'mime_type': fu.mime_type
+            }
+            for fu in payload.file_uploads
+        ]
+
+    query_text, file_uploads = normalize_file_uploads(structured_uploads, payload.query)
+
+    # Debug: Log file uploads if present
+    if file_uploads:
+        logger.info(f"File uploads detected: {len(file_uploads)} file(s)")
+        for i, fu in enumerate(file_uploads):
+            size = f"{len(fu['text'])} chars text" if "text" in fu else f"{len(fu.get('base64_data', ''))} chars base64"
+            logger.info(f"  File {i+1}: {fu.get('filename', 'unknown')} ({fu.get('mime_type', 'unknown')}), size: {size}")
+
+    # Normalize context values to strings to satisfy downstream agents.
+    context = {
+        "user_id": str(payload.user_id) if payload.user_id is not None else "anonymous",
+        "conversation_id": conversation_id,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "file_uploads": file_uploads,  # Pass file uploads to executor
+    }
+
+    return PreparedQuery(
+        payload=payload,
+        conversation_id=conversation_id,
+        history=history,
+        answer_history=answer_history,
+        query_text=query_text,
+        file_uploads=file_uploads,
+        general=handle_general_query(query_text),
+        context=context,
+        deadline=deadline,
+    )
+
+
+def is_short_circuit(prepared: PreparedQuery) -> bool:
+    """True when the general-query guard already answered (no planning needed)."""
+    return prepared.general["kind"] in {"blocked", "general"}
+
+
+async def plan_query(
+    prepared: PreparedQuery,
+    registry: List[AgentMetadata],
+    classified: Optional[Dict[str, Optional[Plan]]] = None,
+) -> Plan:
+    """
+    Plan a prepared query without blocking the event loop: keyword heuristics
+    first, then the plan cache, learned routes and the local intent classifier,
+    then the LLM planner (raising RateLimited when the client's LLM bucket is
+    empty). ``classified`` holds classifier results already scored
+    in bulk (batch endpoint), keyed by query text. In speculative mode the
+    likeliest read-only agent call starts while the LLM is still deciding.
+    """
+    plan = heuristic_plan(prepared.query_text)
+    if plan is not None:
+        return _planned(prepared, plan, "heuristic")
+    plan = plan_cache.get(prepared.query_text, registry, prepared.history)
+    if plan is not None:
+        return _planned(prepared, plan, "cache")
+    plan = learned_router.route(prepared.query_text, registry)
+    if plan is not None:
+        return _planned(prepared, plan, "learned")
+    if classified is not None and prepared.query_text in classified:
+        plan = classified[prepared.query_text]
+    else:
+        plan = intent_classifier.classify(prepared.query_text, registry)
+    if plan is not None:
+        return _planned(prepared, plan, "classifier")
+    # Only LLM-planned queries draw on the client's LLM bucket.
+    await rate_limiter.check("llm", client_key(prepared.payload.user_id))
+    if SPECULATIVE_DISPATCH:
+        prepared.speculation = start_speculation(prepared.query_text, registry, prepared.context)
+    deadline = prepared.deadline
+    try:
+        planning = llm_plan(prepared.query_text, registry, prepared.history, deadline)
+        if deadline is None:
+            plan = await planning
+        else:
+            plan = await asyncio.wait_for(planning, deadline.remaining())
+        plan_cache.put(prepared.query_text, registry, plan, prepared.history)
+        return _planned(prepared, plan, "llm")
+    except asyncio.TimeoutError:
+        logger.warning("Planning cut short by request deadline (%s ms)", deadline.budget_ms)
+        prepared.timed_out.append("plan")
+        if prepared.speculation is not None:
+            prepared.speculation.discard()
+        return Plan(steps=[])
+    except BaseException:
+        if prepared.speculation is not None:
+            prepared.speculation.discard()
+        raise
+
+
+def _planned(prepared: PreparedQuery, plan: Plan, source: str) -> Plan:
+    prepared.plan_source = source
+    record_plan_source(source)
+    return plan
+
+
+async def finish_query(
+    prepared: PreparedQuery,
+    plan: Optional[Plan],
+    registry: List[AgentMetadata],
+    on_event: Optional[EventCallback] = None,
+    limiter: Optional[AgentLimiter] = None,
+    stream_tokens: bool = False,
+) -> SupervisorResponse:
+    """
+    Execute a plan (or short-circuit answer), compose the answer and record the
+    turn. With ``stream_tokens`` the answer is also emitted as ``answer_delta``
+    events while the LLM generates it.
+    """
+    payload = prepared.payload
+    conversation_id = prepared.conversation_id
+
+    if plan is None or is_short_circuit(prepared):
+        answer = prepared.general["answer"] or ""
+        append_turn(conversation_id, "user", payload.query)
+        append_turn(conversation_id, "assistant", answer)
+        emit_event(on_event, "answer", {"answer": answer})
+        return _respond(prepared, SupervisorResponse(answer=answer, used_agents=[], error=None), {})
+
+    late_steps: Optional[asyncio.Task] = None
+    soft_deadline = _soft_deadline_seconds(prepared)
+    try:
+        if soft_deadline is not None:
+            # Slow steps keep running past the soft deadline (bounded by their
+            # own agent timeouts and the hard deadline) and are delivered as a follow-up.
+            step_outputs, used_agents, late_steps = await execute_plan_soft(
+                prepared.query_text,
+                plan,
+                registry,
+                prepared.context,
+                soft_deadline,
+                on_event=on_event,
+                limiter=limiter,
+                speculation=prepared.speculation,
+                deadline=prepared.deadline,
+            )
+        else:
+            step_outputs, used_agents = await execute_plan(
+                prepared.query_text,
+                plan,
+                registry,
+                prepared.context,
+                on_event=on_event,
+                limiter=limiter,
+                speculation=prepared.speculation,
+                deadline=prepared.deadline,
+            )
+    finally:
+        if prepared.speculation is not None:
+            if late_steps is not None:
+                # Steps still running in the background may yet claim the call.
+                speculation = prepared.speculation
+                late_steps.add_done_callback(lambda _: speculation.discard())
+            else:
+                prepared.speculation.discard()
+    if any(r.error and r.error.type == "deadline_exceeded" for r in step_outputs.values()):
+        prepared.timed_out.append("agents")
+    if prepared.plan_source == "llm" and plan.steps and all(r.is_success() for r in step_outputs.values()):
+        # Teach the local router from LLM decisions that actually worked.
+        learned_router.observe(prepared.query_text, plan, registry)
+
+    on_token = None
+    if stream_tokens and on_event is not None:
+
+        def on_token(delta: str) -> None:
+            emit_event(on_event, "answer_delta", {"text": delta})
+
+    pending_ids = [sid for sid, r in step_outputs.items() if r.status == "pending"] if late_steps is not None else []
+    if "plan" in prepared.timed_out:
+        answer = "I ran out of time while planning your request. Please try again."
+    elif pending_ids and len(pending_ids) == len(step_outputs):
+        # Nothing finished by the soft deadline; that is not a failure.
+        answer = "I'm still working on your request."
+    else:
+        answer = direct_answer(plan, step_outputs, registry) or await _compose_within_deadline(
+            prepared, step_outputs, on_token
+        )
+    followup_ids: List[str] = []
+    if late_steps is not None:
+        pending = [step_outputs[sid].agent_name for sid in pending_ids]
+        answer += (
+            f"\n\n_Still waiting on {', '.join(pending)}; "
+            "the full answer will be added to this conversation when it arrives._"
+        )
+        followup = followup_manager.track(
+            ", ".join(pending),
+            "late_results",
+            conversation_id,
+            _complete_late_steps(prepared, plan, registry, late_steps, pending_ids),
+        )
+        followup_ids.append(followup.followup_id)
+        emit_event(on_event, "followup_scheduled", {"followup_id": followup.followup_id, "agent": followup.agent, "intent": followup.intent})
+    emit_event(on_event, "answer", {"answer": answer})
+
+    append_turn(conversation_id, "user", payload.query)
+    append_turn(conversation_id, "assistant", answer)
+
+    response = SupervisorResponse(
+        answer=answer,
+        used_agents=used_agents,
+        error=_deadline_error(prepared),
+        followup_ids=followup_ids,
+    )
+    return _respond(prepared, response, step_outputs)
+
+
+def _respond(
+    prepared: PreparedQuery,
+    response: SupervisorResponse,
+    step_outputs: Dict[int, AgentResponse],
+) -> SupervisorResponse:
+    """Store the step outputs; inline them in the response only for debug requests."""
+    response.request_id = prepared.request_id
+    result_store.put(response, step_outputs)
+    if prepared.payload.options.debug:
+        return response.copy(update={"intermediate_results": intermediate_results(step_outputs)})
+    return response
+
+
+def _soft_deadline_seconds(prepared: PreparedQuery) -> Optional[float]:
+    """Soft deadline for this query in seconds, or None when disabled."""
+    soft_ms = prepared.payload.options.soft_deadline_ms
+    if soft_ms is None:
+        soft_ms = SOFT_DEADLINE_MS
+    if soft_ms <= 0:
+        return None
+    soft = soft_ms / 1000
+    if prepared.deadline is not None:
+        # Never wait past the hard deadline.
+        soft = min(soft, prepared.deadline.remaining())
+    return soft
+
+
+async def _complete_late_steps(
+    prepared: PreparedQuery,
+    plan: Plan,
+    registry: List[AgentMetadata],
+    late_steps: "asyncio.Task",
+    pending_ids: List[int],
+) -> Tuple[Optional[AgentResponse], Optional[str]]:
+    """Wait for slow steps, compose the full answer and push it to the conversation."""
+    step_outputs, _ = await late_steps
+    answer = direct_answer(plan, step_outputs, registry) or await compose_final_answer(
+        prepared.payload.query, step_outputs, prepared.answer_history
+    )
+    append_turn(prepared.conversation_id, "assistant", answer)
+    return step_outputs.get(pending_ids[0]) if pending_ids else None, answer
+
+
+async def _compose_within_deadline(
+    prepared: PreparedQuery,
+    step_outputs: Dict[int, AgentResponse],
+    on_token: Optional[Callable[[str], None]],
+) -> str:
+    """Compose the answer, falling back to stitched results if the budget runs out."""
+    deadline = prepared.deadline
+    composing = compose_final_answer(prepared.payload.query, step_outputs, prepared.answer_history, on_token, deadline)
+    if deadline is None:
+        return await composing
+    try:
+        return await asyncio.wait_for(composing, deadline.remaining())
+    except asyncio.TimeoutError:
+        prepared.timed_out.append("answer")
+        # Deadline has passed, so this returns the stitched results without an LLM call.
+        return await compose_final_answer(prepared.payload.query, step_outputs, prepared.answer_history, deadline=deadline)
+
+
+def _deadline_error(prepared: PreparedQuery) -> Optional[ErrorModel]:
+    if not prepared.timed_out or prepared.deadline is None:
+        return None
+    return ErrorModel(
+        type="deadline_exceeded",
+        message=(
+            f"Request deadline of {prepared.deadline.budget_ms} ms reached during "
+            f"{', '.join(prepared.timed_out)}; partial results returned."
+        ),
+    )
+
+
+async def run_query(
+    payload: FrontendRequest,
+    on_event: Optional[EventCallback] = None,
+    stream_tokens: bool = False,
+) -> SupervisorResponse:
+    """Run the full supervisor flow for one query and return the response."""
+    registry = load_registry()
+    prepared = prepare_query(payload)
+    emit_event(on_event, "general", {"kind": prepared.general["kind"]})
+    if is_short_circuit(prepared):
+        return await finish_query(prepared, None, registry, on_event=on_event)
+
+    plan = await plan_query(prepared, registry)
+    emit_event(on_event, "plan", {"steps": [step.dict() for step in plan.steps]})
+    return await finish_query(prepared, plan, registry, on_event=on_event, stream_tokens=stream_tokens)
+
+
+async def iter_query_events(payload: FrontendRequest) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Run a query and yield ``(event, data)`` pairs as stages complete, ending
+    with ``done`` (the SupervisorResponse) or ``error``. Closing the iterator
+    early cancels the underlying run.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.ensure_future(
+        run_query(payload, on_event=lambda event, data: queue.put_nowait((event, data)), stream_tokens=True)
+    )
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+        try:
+            yield "done", task.result().dict()
+        except RateLimited as exc:
+            yield "error", {"type": "rate_limited", "message": str(exc)}
+        except Exception as exc:
+            logger.error("Streamed query failed: %s", exc)
+            yield "error", {"type": "internal_error", "message": str(exc)}
+    finally:
+        if not task.done():
+            task.cancel()
+            metrics.incr("requests_cancelled_client_disconnect")
+            logger.info("Streamed query cancelled: client disconnected")
+
+
+async def run_until_disconnected(
+    payload: FrontendRequest,
+    is_disconnected: Callable[[], Awaitable[bool]],
+) -> SupervisorResponse:
+    """
+    Run a query while polling ``is_disconnected``; if the client goes away the
+    whole run (planner, agent calls, answer) is cancelled and
+    ClientDisconnected is raised.
+    """
+    task = asyncio.ensure_future(run_query(payload))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await is_disconnected():
+                task.cancel()
+                metrics.incr("requests_cancelled_client_disconnect")
+                logger.info(
+                    "Query cancelled: client disconnected (conversation_id=%s)",
+                    payload.conversation_id or "new",
+                )
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,79 @@
+"""
+Plan cache in front of the LLM planner. Plans are keyed by a normalized query
+fingerprint, the registry version (so registry edits invalidate them) and a
+digest of the conversation history the planner saw. Entries are evicted
+LRU-first and expire after a TTL.
+
+Keyword heuristics still run first: they are cheaper than a cache lookup.
+Empty plans are never cached because they may come from a failed LLM call.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .models import AgentMetadata, Plan
+from .registry import registry_version
+from .ttl_cache import TTLCache
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "1024"))
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", "600"))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Fingerprint text: lowercase, punctuation dropped, whitespace collapsed."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", query.lower())).strip()
+
+
+def _history_digest(history: Optional[List]) -> str:
+    if not history:
+        return ""
+    raw = json.dumps(history, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class PlanCache:
+    """Thread-safe LRU + TTL cache of validated plans."""
+
+    def __init__(self, max_entries: int = PLAN_CACHE_SIZE, ttl_seconds: float = PLAN_CACHE_TTL_SECONDS):
+        self._cache: TTLCache[Tuple[str, str, str], Plan] = TTLCache(max_entries, ttl_seconds, name="plan_cache")
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    def get(self, query: str, registry: List[AgentMetadata], history: Optional[List] = None) -> Optional[Plan]:
+        """Return a cached plan for this query/history, or None."""
+        if not self.enabled:
+            return None
+        plan = self._cache.get((registry_version(registry), normalize_query(query), _history_digest(history)))
+        return plan.copy(deep=True) if plan is not None else None
+
+    def put(
+        self,
+        query: str,
+        registry: List[AgentMetadata],
+        plan: Plan,
+        history: Optional[List] = None,
+    ) -> None:
+        """Store a non-empty plan produced for this query/history."""
+        if not self.enabled or not plan.steps:
+            return
+        key = (registry_version(registry), normalize_query(query), _history_digest(history))
+        self._cache.put(key, plan.copy(deep=True))
+
+    def flush(self) -> int:
+        """Drop every entry; returns how many were removed."""
+        return self._cache.flush()
+
+    def stats(self) -> Dict[str, float]:
+        return self._cache.stats()
+
+
+plan_cache = PlanCache()
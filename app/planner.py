@@ -7,15 +7,18 @@ from __future__ import annotations
 
 import json
 import os
-from typing import List, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 import logging
 
-try:
-    from openai import OpenAI  # type: ignore
-except ImportError:
-    OpenAI = None  # optional; planner will fall back to heuristics
-
+from . import metrics
+from .deadline import Deadline
+from .intent_classifier import intent_classifier
+from .llm import LLMGateway, get_gateway
 from .models import AgentMetadata, Plan, PlanStep
+from .plan_cache import plan_cache
+from .registry import registry_version
 
 logger = logging.getLogger(__name__)
 
@@ -48,26 +51,53 @@ def _validate_steps(raw_steps: List[dict], registry: List[AgentMetadata]) -> Lis
     return valid_steps
 
 
-def _get_openrouter_client():
-    """Return a configured OpenRouter client or None if unavailable."""
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if OpenAI is None or not api_key:
-        return None
-    try:
-        return OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key,
-        )
-    except Exception as exc:
-        logger.error("Failed to configure OpenRouter client: %s", exc)
-        return None
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-2.5-flash-lite")
+# Planner cascade: a fast model first, a stronger one only when its plan looks wrong.
+PLANNER_FAST_MODEL = os.getenv("PLANNER_FAST_MODEL") or OPENROUTER_MODEL
+PLANNER_STRONG_MODEL = os.getenv("PLANNER_STRONG_MODEL") or OPENROUTER_MODEL
+PLANNER_STRICT_SCHEMA = os.getenv("PLANNER_STRICT_SCHEMA", "true").lower() in {"1", "true", "yes"}
+# Classifier score above which an empty fast plan is treated as a likely miss.
+PLANNER_ESCALATE_MIN_SCORE = float(os.getenv("PLANNER_ESCALATE_MIN_SCORE", "0.15"))
+# Token budget for conversation history in the planner prompt.
+PLANNER_HISTORY_TOKENS = int(os.getenv("PLANNER_HISTORY_TOKENS", "600"))
 
+_PLANNER_INSTRUCTIONS = (
+    "You are a planner that selects worker agents to satisfy a user query. "
+    'Return ONLY JSON with the shape {"steps":[{"step_id":0,"agent":...,"intent":...,"input_source":...},...]}. '
+    "input_source is either 'user_query' or 'step:X.output.result'. "
+    "If the request is outside the available agents' scope, return {\"steps\":[]} (empty list) to signal out-of-scope. "
+    "Strictly match agent intents to the user need; avoid generic summarizers unless summarization is explicitly requested. "
+    "\n\nFor onboarding_buddy_agent:\n"
+    "- Use 'onboarding.create' or 'employee.create' for creating new employees\n"
+    "- Use 'onboarding.update' or 'employee.update' for updating employee information\n"
+    "- Use 'onboarding.check_progress' or 'employee.check_status' for checking employee status or profile completion"
+)
 
-OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "google/gemini-2.5-flash-lite")
+# Planner system prompt + schema per registry version.
+_prefix_cache: Dict[str, Tuple[str, dict]] = {}
+_prefix_lock = threading.Lock()
 
 
-def plan_tools_with_llm(query: str, registry: List[AgentMetadata], history: Optional[List] = None) -> Plan:
+async def plan_tools_with_llm(
+    query: str,
+    registry: List[AgentMetadata],
+    history: Optional[List] = None,
+    deadline: Optional[Deadline] = None,
+) -> Plan:
     """Ask an LLM to propose a tool plan; fall back to a safe default or out-of-scope."""
+    heuristic = heuristic_plan(query)
+    if heuristic is not None:
+        return heuristic
+    cached = plan_cache.get(query, registry, history)
+    if cached is not None:
+        return cached
+    plan = await llm_plan(query, registry, history=history, deadline=deadline)
+    plan_cache.put(query, registry, plan, history)
+    return plan
+
+
+def heuristic_plan(query: str) -> Optional[Plan]:
+    """Return a keyword-routed plan for clear intents, or None if nothing matches."""
 
     # Heuristic routing for clear intents to reduce misclassification and avoid
     # calling unrelated agents. If none of the heuristics match and the LLM is
@@ -406,57 +436,201 @@ def plan_tools_with_llm(query: str, registry: List[AgentMetadata], history: Opti
             ]
         )
 
-    
-    
+    return None
+
 
-    client = _get_openrouter_client()
-    if client is None:
+async def llm_plan(
+    query: str,
+    registry: List[AgentMetadata],
+    history: Optional[List] = None,
+    deadline: Optional[Deadline] = None,
+) -> Plan:
+    """
+    Plan with the LLM only (heuristics already missed); empty plan on failure.
+    A fast model plans first; the stronger model is consulted only when the
+    fast plan fails to parse, has steps rejected by validation, or comes back
+    empty while the local classifier thinks the query is in scope. Each call
+    is bounded by the remaining ``deadline`` budget.
+    """
+    if deadline is not None and deadline.expired:
+        logger.warning("Planner skipped: request deadline already reached")
+        return Plan(steps=[])
+    gateway = get_gateway()
+    if not gateway.available():
         # No LLM available and heuristics could not map the query: out of scope.
         return Plan(steps=[])
-    
-    agents_summary = [
-        {"name": a.name, "description": a.description, "intents": a.intents}
-        for a in registry
+
+    # Stable prefix (instructions + agent catalog) first, so provider-side
+    # prompt caching can reuse it; only the short user message varies.
+    system_prompt, plan_schema = _planner_prefix(registry)
+    user_prompt = _planner_user_message(query, history)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
     ]
+    metrics.observe("planner_prompt_chars", len(system_prompt) + len(user_prompt))
 
-    system_prompt = (
-        "You are a planner that selects worker agents to satisfy a user query. "
-        'Return ONLY JSON with the shape {"steps":[{"step_id":0,"agent":...,"intent":...,"input_source":...},...]}. '
-        "input_source is either 'user_query' or 'step:X.output.result'. "
-        "If the request is outside the available agents' scope, return {\"steps\":[]} (empty list) to signal out-of-scope. "
-        "Strictly match agent intents to the user need; avoid generic summarizers unless summarization is explicitly requested. "
-        "\n\nFor onboarding_buddy_agent:\n"
-        "- Use 'onboarding.create' or 'employee.create' for creating new employees\n"
-        "- Use 'onboarding.update' or 'employee.update' for updating employee information\n"
-        "- Use 'onboarding.check_progress' or 'employee.check_status' for checking employee status or profile completion"
-    )
-    user_payload = {
-        "user_query": query,
-        "available_agents": agents_summary,
-    }
+    # Tier 1: fast model, constrained to the plan schema when supported.
+    response_format = plan_schema if PLANNER_STRICT_SCHEMA else None
+    steps, reason = await _plan_with_model(gateway, "fast", PLANNER_FAST_MODEL, messages, registry, deadline, response_format)
+    if reason == "empty" and not _looks_in_scope(query, registry):
+        reason = None  # agreed out of scope: nothing to escalate
+    if reason is None or not _can_escalate(reason):
+        return Plan(steps=steps or [])
+
+    # Tier 2: stronger model, only for failed or doubtful fast plans.
+    if deadline is not None and deadline.expired:
+        logger.warning("Planner escalation skipped: request deadline reached")
+        return Plan(steps=steps or [])
+    metrics.incr("planner_escalations")
+    metrics.incr(f"planner_escalations_{reason}")
+    logger.info("Planner escalating to %s (reason=%s)", PLANNER_STRONG_MODEL, reason)
+    strong_steps, _ = await _plan_with_model(gateway, "strong", PLANNER_STRONG_MODEL, messages, registry, deadline)
+    if strong_steps:
+        return Plan(steps=strong_steps)
+    return Plan(steps=steps or [])
+
+
+def _planner_prefix(registry: List[AgentMetadata]) -> Tuple[str, dict]:
+    """System prompt and plan schema for a registry, built once per registry version."""
+    version = registry_version(registry)
+    with _prefix_lock:
+        cached = _prefix_cache.get(version)
+        if cached is None:
+            catalog = "\n".join(f"- {a.name} [{', '.join(a.intents)}]: {a.description}" for a in registry)
+            system_prompt = f"{_PLANNER_INSTRUCTIONS}\n\nAvailable agents (name [intents]: description):\n{catalog}"
+            if len(_prefix_cache) >= 8:
+                _prefix_cache.clear()  # registry edits are rare; drop stale versions
+            cached = _prefix_cache[version] = (system_prompt, _plan_response_format(registry))
+        return cached
+
+
+def _planner_user_message(query: str, history: Optional[List] = None) -> str:
+    """Compact JSON with the query and the (already budgeted) history window."""
+    payload: dict = {"user_query": query}
     if history:
-        user_payload["recent_history"] = history
-    user_prompt = json.dumps(user_payload, indent=2)
+        payload["recent_history"] = history
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def _can_escalate(reason: str) -> bool:
+    """Failures always get a second try; doubtful plans only when a stronger model exists."""
+    if reason == "failed":
+        return True
+    return PLANNER_STRONG_MODEL != PLANNER_FAST_MODEL
 
+
+def _looks_in_scope(query: str, registry: List[AgentMetadata]) -> bool:
+    """Local signal that an empty LLM plan may be a miss rather than out of scope."""
+    return intent_classifier.best_score(query, registry) >= PLANNER_ESCALATE_MIN_SCORE
+
+
+def _plan_response_format(registry: List[AgentMetadata]) -> dict:
+    """Strict JSON schema for a plan, with agent names restricted to the registry."""
+    step_schema = {
+        "type": "object",
+        "properties": {
+            "step_id": {"type": "integer"},
+            "agent": {"type": "string", "enum": [a.name for a in registry]},
+            "intent": {"type": "string"},
+            "input_source": {"type": "string"},
+        },
+        "required": ["step_id", "agent", "intent", "input_source"],
+        "additionalProperties": False,
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "plan",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"steps": {"type": "array", "items": step_schema}},
+                "required": ["steps"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+async def _plan_with_model(
+    gateway: LLMGateway,
+    tier: str,
+    model: str,
+    messages: List[dict],
+    registry: List[AgentMetadata],
+    deadline: Optional[Deadline],
+    response_format: Optional[dict] = None,
+) -> Tuple[Optional[List[PlanStep]], Optional[str]]:
+    """
+    Run one planner tier. Returns (steps, escalation_reason) where the reason is
+    "failed" (call or JSON error; steps is None), "rejected" (some steps failed
+    validation), "empty" (no steps) or None for a clean plan.
+    """
+    kwargs = {"response_format": response_format} if response_format else {}
+    metrics.incr(f"planner_{tier}_calls")
+    started = time.perf_counter()
     try:
-        response = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+        result = await gateway.complete(
+            "planner",
+            model,
+            messages,
+            timeout=deadline.remaining() if deadline is not None else None,
+            **kwargs,
         )
-        content = response.choices[0].message.content.strip() if response.choices else ""
     except Exception as exc:
-        logger.error("Planner LLM call failed: %s", exc)
-        return Plan(steps=[])
+        logger.error("Planner LLM call failed (%s tier): %s", tier, exc)
+        metrics.incr(f"planner_{tier}_failures")
+        return None, "failed"
+    finally:
+        metrics.observe(f"planner_{tier}_latency_ms", (time.perf_counter() - started) * 1000)
 
-    logger.info("Planner LLM raw response: %s", content)
+    content = result.content
+    metrics.incr(f"planner_{tier}_prompt_tokens", result.prompt_tokens)
+    metrics.incr(f"planner_{tier}_completion_tokens", result.completion_tokens)
+    metrics.incr(f"planner_{tier}_cached_prompt_tokens", result.cached_prompt_tokens)
+    metrics.observe("planner_prompt_tokens", result.prompt_tokens)
+
+    logger.info("Planner LLM raw response (%s tier): %s", tier, content)
     try:
         plan_json = json.loads(content)
         raw_steps = plan_json.get("steps", [])
         validated = _validate_steps(raw_steps, registry)
-        return Plan(steps=validated)
     except Exception as exc:
-        logger.error("Planner failed to parse/validate LLM output: %s", exc)
-        return Plan(steps=[])
\ No newline at end of file
+        logger.error("Planner failed to parse/validate LLM output (%s tier): %s", tier, exc)
+        metrics.incr(f"planner_{tier}_failures")
+        return None, "failed"
+    if len(validated) < len(raw_steps):
+        return validated, "rejected"
+    if not validated:
+        return validated, "empty"
+    return validated, None
+
+
+def cascade_report() -> dict:
+    """Per-tier call counts, latency, tokens and the escalation rate."""
+    snapshot = metrics.snapshot()
+    tiers = {}
+    for tier, model in (("fast", PLANNER_FAST_MODEL), ("strong", PLANNER_STRONG_MODEL)):
+        tiers[tier] = {
+            "model": model,
+            "calls": int(metrics.get_counter(f"planner_{tier}_calls")),
+            "failures": int(metrics.get_counter(f"planner_{tier}_failures")),
+            "prompt_tokens": int(metrics.get_counter(f"planner_{tier}_prompt_tokens")),
+            "completion_tokens": int(metrics.get_counter(f"planner_{tier}_completion_tokens")),
+            "cached_prompt_tokens": int(metrics.get_counter(f"planner_{tier}_cached_prompt_tokens")),
+            "latency_ms": snapshot["series"].get(f"planner_{tier}_latency_ms"),
+        }
+    fast_calls = tiers["fast"]["calls"]
+    escalations = int(metrics.get_counter("planner_escalations"))
+    return {
+        "tiers": tiers,
+        "escalations": escalations,
+        "escalation_reasons": {
+            reason: int(metrics.get_counter(f"planner_escalations_{reason}"))
+            for reason in ("failed", "rejected", "empty")
+        },
+        "escalation_rate": round(escalations / fast_calls, 4) if fast_calls else 0.0,
+        "prompt_tokens_per_call": snapshot["series"].get("planner_prompt_tokens"),
+        "prompt_chars_per_plan": snapshot["series"].get("planner_prompt_chars"),
+    }
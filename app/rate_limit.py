@@ -0,0 +1,248 @@
+"""
+Per-client token-bucket rate limiting, so one noisy script cannot use up the
+agents and LLM quota for everyone else.
+
+Two buckets per client:
+- ``request``: every query request. This is checked in ASGI middleware before
+  the body is read, so a rejected request never uploads or parses its files.
+- ``llm``: charged only when a query reaches the LLM planner. Heuristic,
+  cached and locally classified queries cost nothing here. In a batch, each
+  distinct LLM plan costs one token (identical queries share one).
+
+Both buckets use the client key the middleware resolves: the client IP, or
+the ``X-User-Id`` header when the request comes through one of
+``RATE_LIMIT_TRUSTED_PROXIES`` (a gateway that authenticated the user). A
+client-supplied header or payload ``user_id`` never picks the bucket, so
+rotating it does not buy a fresh one. Queued jobs carry the key of the
+request that submitted them.
+
+Buckets live in process memory by default. Set ``RATE_LIMIT_SQLITE_PATH`` to
+share them between worker processes on one host.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in {"1", "true", "yes"}
+# Sustained rate (tokens per minute) and burst size for each bucket.
+RATE_LIMIT_REQUESTS_PER_MINUTE = float(os.getenv("RATE_LIMIT_REQUESTS_PER_MINUTE", "60"))
+RATE_LIMIT_REQUESTS_BURST = float(os.getenv("RATE_LIMIT_REQUESTS_BURST", "20"))
+RATE_LIMIT_LLM_PER_MINUTE = float(os.getenv("RATE_LIMIT_LLM_PER_MINUTE", "20"))
+RATE_LIMIT_LLM_BURST = float(os.getenv("RATE_LIMIT_LLM_BURST", "5"))
+RATE_LIMIT_USER_HEADER = os.getenv("RATE_LIMIT_USER_HEADER", "X-User-Id")
+# Peers (comma-separated IPs) that authenticate users and may set RATE_LIMIT_USER_HEADER.
+RATE_LIMIT_TRUSTED_PROXIES = {
+    ip.strip() for ip in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if ip.strip()
+}
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "")
+# In-memory mode: drop idle buckets once this many clients are tracked.
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+
+# POST routes whose requests are charged to the request bucket.
+RATE_LIMITED_PATHS = {"/api/query", "/api/query/stream", "/api/query/batch", "/api/jobs"}
+# Routes whose runs charge the LLM bucket to the middleware's client key.
+_KEYED_PATHS = {"/api/query", "/api/query/stream", "/api/query/batch", "/api/jobs"}
+
+# Client key resolved by the middleware for the current request.
+_client_key: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("rate_limit_client_key", default=None)
+
+
+class RateLimited(Exception):
+    """Raised when a client's bucket is empty."""
+
+    def __init__(self, bucket: str, retry_after: int):
+        super().__init__(f"Rate limit exceeded ({bucket}); retry in {retry_after}s")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict guarded by a lock."""
+
+    # Cheap enough to call on the event loop.
+    blocking = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # {key: (tokens, last update, refill rate, burst)}
+        self._buckets: Dict[str, Tuple[float, float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """Take ``cost`` tokens; returns 0 on success, else seconds until enough refill."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now, rate, burst))[:2]
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, rate, burst)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled completely carries no state worth keeping.
+        idle = [
+            key
+            for key, (tokens, updated, rate, burst) in self._buckets.items()
+            if tokens + (now - updated) * rate >= burst
+        ]
+        for key in idle:
+            del self._buckets[key]
+
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file shared by every worker process on the host."""
+
+    # May wait up to the connection timeout for the file lock: run off the loop.
+    blocking = True
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        # Wall-clock time: monotonic clocks are not comparable across processes.
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+                wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+                if not wait:
+                    tokens -= cost
+                self._conn.execute("INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?)", (key, tokens, now))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+
+class RateLimiter:
+    """Named token buckets (request, llm) per client key."""
+
+    def __init__(self, enabled: bool = RATE_LIMIT_ENABLED, sqlite_path: str = RATE_LIMIT_SQLITE_PATH):
+        self.enabled = enabled
+        self.buckets: Dict[str, Tuple[float, float]] = {
+            "request": (RATE_LIMIT_REQUESTS_PER_MINUTE / 60, RATE_LIMIT_REQUESTS_BURST),
+            "llm": (RATE_LIMIT_LLM_PER_MINUTE / 60, RATE_LIMIT_LLM_BURST),
+        }
+        self.store = SQLiteBucketStore(sqlite_path) if sqlite_path else MemoryBucketStore()
+
+    async def check(self, bucket: str, key: Optional[str], cost: float = 1) -> None:
+        """Charge ``key``'s ``bucket``; raises RateLimited when it is empty."""
+        if not self.enabled or not key:
+            return
+        rate, burst = self.buckets[bucket]
+        if rate <= 0:
+            return
+        try:
+            if self.store.blocking:
+                wait = await asyncio.to_thread(self.store.take, f"{bucket}:{key}", rate, burst, cost)
+            else:
+                wait = self.store.take(f"{bucket}:{key}", rate, burst, cost)
+        except sqlite3.Error as exc:
+            # Fail open: a busy or broken shared store must not take the API down.
+            logger.warning("Rate limit store error: %s", exc)
+            return
+        if wait:
+            metrics.incr(f"rate_limit_{bucket}_rejected")
+            raise RateLimited(bucket, max(1, math.ceil(wait)))
+        metrics.incr(f"rate_limit_{bucket}_allowed")
+
+
+def client_key(user_id: Optional[str] = None) -> Optional[str]:
+    """
+    Rate-limit key for a run: the key resolved by the middleware (or bound for
+    a job), else ``user_id`` for runs started outside any request.
+    """
+    return _client_key.get() or (f"user:{user_id}" if user_id else None)
+
+
+@contextmanager
+def bound_client_key(key: Optional[str]) -> Iterator[None]:
+    """Charge runs inside the block to ``key`` (jobs run after their request ended)."""
+    token = _client_key.set(key)
+    try:
+        yield
+    finally:
+        _client_key.reset(token)
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware charging the request bucket before the body is read, and
+    exposing the client key to the pipeline for the LLM bucket.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    def _resolve_key(self, scope) -> Optional[str]:
+        client = scope.get("client")
+        if client and client[0] in RATE_LIMIT_TRUSTED_PROXIES:
+            header = RATE_LIMIT_USER_HEADER.lower().encode("latin-1")
+            for name, value in scope.get("headers") or []:
+                if name == header and value:
+                    return f"user:{value.decode('latin-1')}"
+        return f"ip:{client[0]}" if client else None
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if scope["type"] != "http" or scope.get("method") != "POST" or path not in RATE_LIMITED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        key = self._resolve_key(scope)
+        try:
+            await self.limiter.check("request", key)
+        except RateLimited as exc:
+            await _send_429(send, exc)
+            return
+        if path not in _KEYED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        with bound_client_key(key):
+            await self.app(scope, receive, send)
+
+
+async def _send_429(send, exc: RateLimited) -> None:
+    body = json.dumps({"detail": str(exc)}).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(exc.retry_after).encode("latin-1")),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+rate_limiter = RateLimiter()
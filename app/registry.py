@@ -4,6 +4,8 @@ capabilities and (b) look up connection details when calling a worker.
 """
 from __future__ import annotations
 
+import hashlib
+import json
 from typing import List
 
 from .models import AgentMetadata
@@ -19,6 +21,7 @@ def load_registry() -> List[AgentMetadata]:
             type="http",
             endpoint="https://example.com/progress/handle",
             healthcheck="https://example.com/progress/health",
+            read_only_intents=["progress.track"],
         ),
         AgentMetadata(
             name="email_priority_agent",
@@ -28,6 +31,7 @@ def load_registry() -> List[AgentMetadata]:
             endpoint="https://spm-email-priority-agent.onrender.com/handle",
             healthcheck="https://spm-email-priority-agent.onrender.com/health",
             timeout_ms=40000,
+            read_only_intents=["email.priority.classify"],
         ),
         AgentMetadata(
             name="document_summarizer_agent",
@@ -37,6 +41,12 @@ def load_registry() -> List[AgentMetadata]:
             endpoint="http://5.161.59.136:8000/api/agent/execute",
             healthcheck="http://5.161.59.136:8000/health",
             timeout_ms=30000,
+            read_only_intents=["summary.create", "summarize_document", "summarize_text", "extract_key_points", "identify_risks", "extract_action_items"],
+            # Summaries come back as finished markdown.
+            synthesis={
+                intent: "passthrough"
+                for intent in ["summary.create", "summarize_document", "summarize_text", "extract_key_points", "identify_risks", "extract_action_items"]
+            },
         ),
         AgentMetadata(
             name="meeting_followup_agent",
@@ -62,6 +72,8 @@ def load_registry() -> List[AgentMetadata]:
             endpoint="https://onboardingbuddyagent-production.up.railway.app/execute",
             healthcheck="https://onboardingbuddyagent-production.up.railway.app/health",
             timeout_ms=100000,
+            read_only_intents=["onboarding.check_progress", "employee.check_status"],
+            synthesis={"onboarding.check_progress": "template", "employee.check_status": "template"},
         ),
         AgentMetadata(
             name="KnowledgeBaseBuilderAgent",
@@ -97,6 +109,12 @@ def load_registry() -> List[AgentMetadata]:
             endpoint="https://spm-agent-api-production.up.railway.app/agent/json",
             healthcheck="https://spm-agent-api-production.up.railway.app/health",
             timeout_ms=30000,
+            read_only_intents=[
+                "productivity.analyze",
+                "productivity.report",
+                "productivity.insights",
+                "productivity.accountability",
+            ],
         ),
 
         AgentMetadata(
@@ -106,6 +124,7 @@ def load_registry() -> List[AgentMetadata]:
             type="http",
             endpoint="https://example.com/deadline/handle",
             healthcheck="https://example.com/deadline/health",
+            read_only_intents=["deadline.monitor"],
         ),
         AgentMetadata(
             name="budget_tracker_agent",
@@ -124,6 +143,9 @@ def load_registry() -> List[AgentMetadata]:
             endpoint="https://budget-tracker-agent.onrender.com/api/query",
             healthcheck="https://budget-tracker-agent.onrender.com/api/health",
             timeout_ms=30000,  # Increased to 30s for Render.com cold starts (docs say 5000ms but that's too short for cold starts)
+            # budget.question is excluded: the agent may treat it as an update.
+            read_only_intents=["budget.check", "budget.predict", "budget.recommend", "budget.analyze", "budget.report", "budget.list"],
+            synthesis={"budget.list": "template"},
         ),
     ]
 
@@ -132,4 +154,9 @@ def find_agent_by_name(name: str, registry: List[AgentMetadata]) -> AgentMetadat
     for agent in registry:
         if agent.name == name:
             return agent
-    raise KeyError(f"Agent {name} not found in registry")
\ No newline at end of file
+    raise KeyError(f"Agent {name} not found in registry")
+
+def registry_version(registry: List[AgentMetadata]) -> str:
+    """Short content hash of the registry; changes whenever agents/intents change."""
+    payload = json.dumps([a.dict() for a in registry], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,52 @@
+"""
+Server-side store of per-step agent outputs. Responses carry
+``intermediate_results`` only when the request sets ``options.debug``. For
+every other request the outputs are kept here under the response's
+``request_id`` and served by GET /api/requests/{request_id}, so normal
+responses stay small and fast to encode.
+
+Outputs are stored as AgentResponse objects and serialized only when someone
+asks for them. Entries are evicted LRU-first and expire after a TTL. The
+store is in-memory and per-process.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, Optional, Tuple
+
+from .models import AgentResponse, SupervisorResponse
+from .ttl_cache import TTLCache
+
+RESULT_STORE_SIZE = int(os.getenv("RESULT_STORE_SIZE", "500"))
+RESULT_STORE_TTL_SECONDS = float(os.getenv("RESULT_STORE_TTL_SECONDS", "900"))
+
+
+def intermediate_results(step_outputs: Dict[int, AgentResponse]) -> Dict[str, dict]:
+    return {f"step_{sid}": step_outputs[sid].dict() for sid in step_outputs}
+
+
+class ResultStore:
+    """Thread-safe LRU + TTL store of responses and their step outputs."""
+
+    def __init__(self, max_entries: int = RESULT_STORE_SIZE, ttl_seconds: float = RESULT_STORE_TTL_SECONDS):
+        self._entries: TTLCache[str, Tuple[SupervisorResponse, Dict[int, AgentResponse]]] = TTLCache(
+            max_entries, ttl_seconds, name="result_store"
+        )
+
+    def put(self, response: SupervisorResponse, step_outputs: Dict[int, AgentResponse]) -> None:
+        if response.request_id:
+            self._entries.put(response.request_id, (response, dict(step_outputs)))
+
+    def get(self, request_id: str) -> Optional[SupervisorResponse]:
+        """The full response (with intermediate_results) for ``request_id``, or None."""
+        entry = self._entries.get(request_id)
+        if entry is None:
+            return None
+        response, step_outputs = entry
+        return response.copy(update={"intermediate_results": intermediate_results(step_outputs)})
+
+    def stats(self) -> Dict[str, float]:
+        return self._entries.stats()
+
+
+result_store = ResultStore()
@@ -1,39 +1,80 @@
 """
-FastAPI application wiring: routes for home page, query handling, agents listing,
-and health. The heavy lifting lives in other modules to keep concerns separated.
+FastAPI application wiring: routes for home page, query handling (sync, streamed,
+batch and async jobs), agents listing, and health. The heavy lifting lives in
+other modules to keep concerns separated.
 """
 from __future__ import annotations
 
-import uuid
-from datetime import datetime, timezone
-from typing import Dict
+import os
+import time
+from typing import Dict, List, Optional, Union
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import logging
 
 logger = logging.getLogger(__name__)
 
-try:
-    import httpx  # type: ignore
-except ImportError:
-    httpx = None
-
-from .answer import compose_final_answer
-from .conversation import append_turn, get_history
-from .executor import execute_plan
-from .general import handle_general_query
-from .file_utils import normalize_file_uploads
-from .models import FrontendRequest, SupervisorResponse
-from .planner import plan_tools_with_llm
+from .admission import AdmissionRejected, admission
+from .answer_cache import answer_cache
+from .batch import BATCH_MAX_QUERIES, run_batch
+from .followups import followup_manager
+from .idempotency import IDEMPOTENCY_KEY_MAX_LENGTH, IdempotencyConflict, idempotency_store
+from .intent_classifier import intent_classifier
+from .jobs import JobQueueFull, job_manager
+from .learned_routes import learned_router, plan_source_report
+from .models import BatchQueryRequest, FollowupInfo, FrontendRequest, JobInfo, SupervisorResponse
+from . import metrics
+from .plan_cache import plan_cache
+from .planner import cascade_report
+from .pipeline import ClientDisconnected, iter_query_events, run_query, run_until_disconnected
+from .rate_limit import RateLimitMiddleware, RateLimited, client_key, rate_limiter
 from .registry import load_registry
+from .result_store import result_store
+from .streaming import format_ndjson, format_sse
+from .tasks_proxy import TasksUnavailable, tasks_proxy
 from .web import render_home, render_agents_page, render_query_page, render_tasks_page
 
+# Optional shared secret for /api/admin/* routes (X-Admin-Token header).
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def _retry_later(exc: Union[AdmissionRejected, RateLimited]) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+
+
+class _AdmittedStream(StreamingResponse):
+    """
+    Streaming response holding an admission slot until it has been sent. The
+    slot is released however the response ends, including a client that goes
+    away before the body iterator ever starts.
+    """
+
+    def __init__(self, content, lane: str, **kwargs):
+        super().__init__(content, **kwargs)
+        self.lane = lane
+        self.admitted_at = time.monotonic()
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release(self.lane, time.monotonic() - self.admitted_at)
+
 
 def build_app() -> FastAPI:
     # Basic logging setup for planner debugging; in production replace with structured logging.
     if not logging.getLogger().handlers:
         logging.basicConfig(level=logging.INFO)
     app = FastAPI(title="Supervisor Agent Demo")
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+    # Build the local routing index now rather than on the first query.
+    intent_classifier.warm(load_registry())
 
     @app.get("/")
     async def home():
@@ -56,92 +97,226 @@ def build_app() -> FastAPI:
         return [agent.dict() for agent in load_registry()]
 
     @app.get("/api/tasks")
-    async def list_tasks():
-        if httpx is None:
-            raise HTTPException(status_code=503, detail="httpx not installed to fetch tasks")
+    async def list_tasks(if_none_match: Optional[str] = Header(default=None)):
         try:
-            async with httpx.AsyncClient(timeout=15) as client:
-                resp = await client.get("http://vps.zaim-abbasi.tech/knowledge-builder/tasks")
-                resp.raise_for_status()
-                data = resp.json()
-                tasks = data.get("tasks") if isinstance(data, dict) else data
-                if not isinstance(tasks, list):
-                    tasks = []
-                return {"tasks": tasks, "count": len(tasks), "status": data.get("status") if isinstance(data, dict) else None}
-        except httpx.HTTPStatusError as exc:
-            logger.error("Tasks fetch failed with status %s", exc.response.status_code)
-            raise HTTPException(status_code=502, detail="Failed to fetch tasks from knowledge base")
-        except Exception as exc:
+            snapshot = await tasks_proxy.get()
+        except TasksUnavailable as exc:
             logger.error("Tasks fetch failed: %s", exc)
             raise HTTPException(status_code=502, detail="Failed to fetch tasks from knowledge base")
+        # Browsers revalidate on every load; an unchanged list costs a 304.
+        headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+        if if_none_match and snapshot.etag in {tag.strip() for tag in if_none_match.split(",")}:
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(snapshot.body, headers=headers)
 
     @app.post("/api/query", response_model=SupervisorResponse)
-    async def handle_query(payload: FrontendRequest) -> SupervisorResponse:
+    async def handle_query(
+        payload: FrontendRequest,
+        request: Request,
+        response: Response,
+        idempotency_key: Optional[str] = Header(default=None),
+    ) -> SupervisorResponse:
+        if not payload.query.strip():
+            raise HTTPException(status_code=400, detail="Query cannot be empty")
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+        lane = admission.classify(payload.query)
+
+        try:
+            if idempotency_key:
+                # Retries attach to (or replay) the first run instead of repeating it.
+                async def admitted_run() -> SupervisorResponse:
+                    async with admission.admit(lane):
+                        return await run_query(payload)
+
+                scope = client_key(payload.user_id) or "anonymous"
+                result, replayed = await idempotency_store.execute(
+                    f"{scope}:{idempotency_key}", payload, admitted_run, request.is_disconnected
+                )
+                if replayed:
+                    response.headers["Idempotent-Replayed"] = "true"
+                return result
+            async with admission.admit(lane):
+                return await run_until_disconnected(payload, request.is_disconnected)
+        except IdempotencyConflict as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+        except (AdmissionRejected, RateLimited) as exc:
+            raise _retry_later(exc)
+        except ClientDisconnected:
+            # 499 (client closed request): nobody is left to read the body.
+            return Response(status_code=499)
+
+    @app.get("/api/requests/{request_id}", response_model=SupervisorResponse)
+    async def get_request_result(request_id: str) -> SupervisorResponse:
+        result = result_store.get(request_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Request result not found or expired")
+        return result
+
+    @app.post("/api/query/stream")
+    async def stream_query(payload: FrontendRequest):
         if not payload.query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty")
 
-        registry = load_registry()
-        conversation_id = payload.conversation_id or str(uuid.uuid4())
-        history = get_history(conversation_id)
-
-        # Normalize file uploads: prefer structured field, fallback to query text parsing
-        structured_uploads = None
-        if payload.file_uploads:
-            # Convert Pydantic models to dicts for utility function
-            structured_uploads = [
-                {
-                    'base64_data': fu.base64_data,
-                    'filename': fu.filename,
-                    'mime_type': fu.mime_type
-                }
-                for fu in payload.file_uploads
-            ]
-        
-        query_text, file_uploads = normalize_file_uploads(structured_uploads, payload.query)
-        
-        # Debug: Log file uploads if present
-        if file_uploads:
-            logger.info(f"File uploads detected: {len(file_uploads)} file(s)")
-            for i, fu in enumerate(file_uploads):
-                logger.info(f"  File {i+1}: {fu.get('filename', 'unknown')} ({fu.get('mime_type', 'unknown')}), size: {len(fu.get('base64_data', ''))} chars")
-
-        general = handle_general_query(query_text)
-        if general["kind"] in {"blocked", "general"}:
-            answer = general["answer"] or ""
-            intermediate_results: Dict[str, str] = {}
-            append_turn(conversation_id, "user", payload.query)
-            append_turn(conversation_id, "assistant", answer)
-            return SupervisorResponse(
-                answer=answer,
-                used_agents=[],
-                intermediate_results=intermediate_results,
-                error=None,
-            )
-
-        plan = plan_tools_with_llm(query_text, registry, history=history)
-
-        # Normalize context values to strings to satisfy downstream agents.
-        context = {
-            "user_id": str(payload.user_id) if payload.user_id is not None else "anonymous",
-            "conversation_id": conversation_id,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "file_uploads": file_uploads,  # Pass file uploads to executor
-        }
-
-        step_outputs, used_agents = await execute_plan(query_text, plan, registry, context)
-        answer = compose_final_answer(payload.query, step_outputs, history=history)
-
-        intermediate_results = {f"step_{sid}": step_outputs[sid].dict() for sid in step_outputs}
-
-        append_turn(conversation_id, "user", payload.query)
-        append_turn(conversation_id, "assistant", answer)
-
-        return SupervisorResponse(
-            answer=answer,
-            used_agents=used_agents,
-            intermediate_results=intermediate_results,
-            error=None,
-        )
+        # Admit before the response starts so a shed request still gets a 429;
+        # the slot is held until the stream ends or the client goes away.
+        lane = admission.classify(payload.query)
+        try:
+            await admission.acquire(lane)
+        except AdmissionRejected as exc:
+            raise _retry_later(exc)
+
+        async def event_source():
+            async for event, data in iter_query_events(payload):
+                yield format_sse(event, data)
+
+        return _AdmittedStream(event_source(), lane, media_type="text/event-stream")
+
+    @app.post("/api/query/batch")
+    async def handle_batch(payload: BatchQueryRequest):
+        if not payload.queries:
+            raise HTTPException(status_code=400, detail="Batch must contain at least one query")
+        if len(payload.queries) > BATCH_MAX_QUERIES:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_QUERIES} queries")
+        try:
+            await admission.acquire("batch")
+        except AdmissionRejected as exc:
+            raise _retry_later(exc)
+
+        async def result_lines():
+            async for item in run_batch(payload.queries):
+                yield format_ndjson(item.dict())
+
+        return _AdmittedStream(result_lines(), "batch", media_type="application/x-ndjson")
+
+    @app.post("/api/jobs", response_model=JobInfo, status_code=202)
+    async def create_job(payload: FrontendRequest) -> JobInfo:
+        if not payload.query.strip():
+            raise HTTPException(status_code=400, detail="Query cannot be empty")
+        try:
+            job = job_manager.submit(payload)
+        except JobQueueFull as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
+        return job.info()
+
+    @app.get("/api/jobs/{job_id}", response_model=JobInfo)
+    async def get_job(job_id: str) -> JobInfo:
+        job = job_manager.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job.info()
+
+    @app.get("/api/jobs/{job_id}/events")
+    async def stream_job(job_id: str):
+        job = job_manager.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        async def event_source():
+            async for item in job.stream():
+                yield format_sse(item.event, item.data)
+            yield format_sse("result", job.info().dict())
+
+        return StreamingResponse(event_source(), media_type="text/event-stream")
+
+    @app.get("/api/followups", response_model=List[FollowupInfo])
+    async def list_followups(
+        limit: int = 20,
+        conversation_id: Optional[str] = None,
+        intent: Optional[str] = None,
+    ) -> List[FollowupInfo]:
+        runs = followup_manager.recent(limit, conversation_id=conversation_id, intent=intent)
+        return [run.info() for run in runs]
+
+    @app.get("/api/followups/{followup_id}", response_model=FollowupInfo)
+    async def get_followup(followup_id: str) -> FollowupInfo:
+        run = followup_manager.get(followup_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail="Follow-up not found")
+        return run.info()
+
+    @app.get("/api/followups/{followup_id}/events")
+    async def stream_followup(followup_id: str):
+        run = followup_manager.get(followup_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail="Follow-up not found")
+
+        async def event_source():
+            async for item in run.stream():
+                yield format_sse(item.event, item.data)
+            yield format_sse("result", run.info().dict())
+
+        return StreamingResponse(event_source(), media_type="text/event-stream")
+
+    @app.get("/api/admin/plan-cache")
+    async def plan_cache_stats(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return plan_cache.stats()
+
+    @app.post("/api/admin/plan-cache/flush")
+    async def flush_plan_cache(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return {"flushed": plan_cache.flush()}
+
+    @app.get("/api/admin/answer-cache")
+    async def answer_cache_stats(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return answer_cache.stats()
+
+    @app.post("/api/admin/answer-cache/flush")
+    async def flush_answer_cache(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return {"flushed": answer_cache.flush()}
+
+    @app.get("/api/admin/planner")
+    async def planner_stats(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return {"cascade": cascade_report(), "plan_sources": plan_source_report()}
+
+    @app.get("/api/admin/admission")
+    async def admission_stats(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return {"enabled": admission.enabled, "lanes": admission.stats()}
+
+    @app.get("/api/admin/idempotency")
+    async def idempotency_stats(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return idempotency_store.stats()
+
+    @app.get("/api/admin/tasks-cache")
+    async def tasks_cache_stats(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return tasks_proxy.stats()
+
+    @app.get("/api/admin/learned-routes")
+    async def learned_routes(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return learned_router.export()
+
+    @app.post("/api/admin/learned-routes/promote")
+    async def promote_learned_routes(x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        return {"promoted": learned_router.promote()}
+
+    @app.post("/api/admin/learned-routes/enabled")
+    async def toggle_learned_routes(enabled: bool, x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        learned_router.enabled = enabled
+        return {"enabled": learned_router.enabled}
+
+    @app.post("/api/admin/learned-routes/{ngram}/status")
+    async def review_learned_route(ngram: str, status: str, x_admin_token: Optional[str] = Header(default=None)):
+        _require_admin(x_admin_token)
+        if status not in {"active", "proposed", "rejected"}:
+            raise HTTPException(status_code=400, detail="status must be active, proposed or rejected")
+        rule = learned_router.set_status(ngram, status)
+        if rule is None:
+            raise HTTPException(status_code=404, detail="Rule not found")
+        return rule
+
+    @app.get("/api/metrics")
+    async def get_metrics():
+        return metrics.snapshot()
 
     @app.get("/health")
     async def health() -> Dict[str, str]:
@@ -0,0 +1,106 @@
+"""
+Speculative agent dispatch. When keyword heuristics miss, the planner needs a
+full LLM round-trip before any agent is called. In speculative mode a cheap
+local scorer guesses the most likely read-only agent/intent and starts that
+call concurrently with LLM planning; the executor reuses the in-flight result
+if the LLM plan agrees, otherwise the call is cancelled and discarded.
+
+Only intents listed in an agent's ``read_only_intents`` are ever speculated, so
+a wrong guess never has side effects.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .agent_caller import call_agent
+from .models import AgentMetadata, AgentResponse
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_DISPATCH = os.getenv("SPECULATIVE_DISPATCH", "false").lower() in {"1", "true", "yes"}
+SPECULATION_MIN_SCORE = float(os.getenv("SPECULATION_MIN_SCORE", "0.25"))
+
+_WORD = re.compile(r"[a-z][a-z0-9]+")
+_STOPWORDS = {
+    "the", "and", "for", "with", "from", "into", "that", "this", "are", "was", "can",
+    "use", "only", "when", "what", "how", "my", "our", "your", "all", "any", "has",
+    "have", "you", "about", "their", "them", "they", "its", "via", "per", "please",
+    "show", "give", "tell", "get",
+}
+
+
+def _tokens(text: str) -> Set[str]:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+
+def propose(query: str, registry: List[AgentMetadata]) -> Optional[Tuple[AgentMetadata, str, float]]:
+    """
+    Score read-only (agent, intent) pairs by word overlap with the query and
+    return the best one if it clears SPECULATION_MIN_SCORE.
+    """
+    query_tokens = _tokens(query)
+    if not query_tokens:
+        return None
+
+    best: Optional[Tuple[AgentMetadata, str, float]] = None
+    for agent in registry:
+        if not agent.read_only_intents:
+            continue
+        agent_tokens = _tokens(agent.description) | _tokens(agent.name.replace("_", " "))
+        agent_score = len(query_tokens & agent_tokens) / len(query_tokens)
+        for intent in agent.read_only_intents:
+            intent_tokens = _tokens(intent.replace(".", " ").replace("_", " "))
+            # Intent words are a stronger signal than description words.
+            score = agent_score + 0.5 * len(query_tokens & intent_tokens) / len(query_tokens)
+            if best is None or score > best[2]:
+                best = (agent, intent, score)
+
+    if best is None or best[2] < SPECULATION_MIN_SCORE:
+        return None
+    return best
+
+
+class Speculation:
+    """An in-flight speculative call that the executor may claim once."""
+
+    def __init__(self, agent: str, intent: str, text: str, task: "asyncio.Task[AgentResponse]"):
+        self.agent = agent
+        self.intent = intent
+        self.text = text
+        self.task = task
+        self.claimed = False
+        self.discarded = False
+
+    def claim(self, agent: str, intent: str, text: str) -> Optional["asyncio.Task[AgentResponse]"]:
+        """Hand over the in-flight call if it matches this step exactly (and is still live)."""
+        if self.claimed or self.discarded or self.task.cancelled():
+            return None
+        if (agent, intent, text) != (self.agent, self.intent, self.text):
+            return None
+        self.claimed = True
+        logger.info("Speculative call reused: agent=%s intent=%s", agent, intent)
+        return self.task
+
+    def discard(self) -> None:
+        """Cancel the call if the plan did not use it."""
+        if self.claimed or self.discarded:
+            return
+        self.discarded = True
+        if not self.task.done():
+            self.task.cancel()
+        logger.info("Speculative call discarded: agent=%s intent=%s", self.agent, self.intent)
+
+
+def start_speculation(query: str, registry: List[AgentMetadata], context: Dict[str, Any]) -> Optional[Speculation]:
+    """Start the most likely read-only call for ``query`` in the background."""
+    proposal = propose(query, registry)
+    if proposal is None:
+        return None
+    agent_meta, intent, score = proposal
+    logger.info("Speculating on agent=%s intent=%s (score=%.2f)", agent_meta.name, intent, score)
+    task = asyncio.ensure_future(call_agent(agent_meta, intent, query, context))
+    return Speculation(agent_meta.name, intent, query, task)
@@ -0,0 +1,59 @@
+"""
+Helpers for streamed responses: wire framing (server-sent events, NDJSON) and an
+in-memory event log that background work records into and listeners follow.
+Kept separate so every streaming endpoint behaves identically.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List
+
+from .models import JobEvent
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Frame one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def format_ndjson(data: Any) -> str:
+    """Serialize one newline-delimited JSON record."""
+    return json.dumps(data, default=str) + "\n"
+
+
+class EventLog:
+    """
+    Append-only progress log with async streaming. Subclasses define when the
+    tracked work is ``finished`` so streams know when to stop.
+    """
+
+    def __init__(self):
+        self.events: List[JobEvent] = []
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return False
+
+    def record(self, event: str, data: Dict[str, Any]) -> None:
+        """Append a progress event and wake any stream listeners."""
+        self.events.append(
+            JobEvent(event=event, data=data, timestamp=datetime.now(timezone.utc).isoformat())
+        )
+        # Swap in a fresh Event so each listener waits for the *next* change.
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def stream(self) -> AsyncIterator[JobEvent]:
+        """Yield recorded events (past and future) until the work finishes."""
+        cursor = 0
+        while True:
+            changed = self._changed
+            while cursor < len(self.events):
+                yield self.events[cursor]
+                cursor += 1
+            if self.finished:
+                return
+            await changed.wait()
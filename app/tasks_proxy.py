@@ -0,0 +1,203 @@
+"""
+Cached proxy for the knowledge-builder task list shown on the tasks page.
+
+One shared HTTP client keeps a snapshot of the upstream list:
+- A fresh snapshot (younger than TASKS_CACHE_TTL_SECONDS) is served as is.
+- A stale snapshot (up to TASKS_STALE_SECONDS old) is still served right
+  away while a single background request revalidates it. Readers only wait
+  on the VPS when there is no usable snapshot.
+- Revalidation sends If-None-Match, so an unchanged list costs a 304.
+- Browsers get an ETag, and a matching If-None-Match gets a 304.
+
+Runs of agents that write tasks (create_task, dependency resolution) call
+``invalidate_for``, which only marks the snapshot stale: the next reader
+serves it and starts the revalidation, so writes nobody reads back cost no
+upstream request. State is per-process.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Set
+
+try:
+    import httpx  # type: ignore
+except ImportError:
+    httpx = None
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+TASKS_URL = os.getenv("TASKS_URL", "http://vps.zaim-abbasi.tech/knowledge-builder/tasks")
+TASKS_CACHE_TTL_SECONDS = float(os.getenv("TASKS_CACHE_TTL_SECONDS", "15"))
+# Oldest snapshot still served while a refresh runs; older ones make readers wait.
+TASKS_STALE_SECONDS = float(os.getenv("TASKS_STALE_SECONDS", "300"))
+TASKS_FETCH_TIMEOUT_SECONDS = float(os.getenv("TASKS_FETCH_TIMEOUT_SECONDS", "15"))
+
+# Agents whose successful runs change the upstream task list.
+TASK_WRITER_AGENTS = {"KnowledgeBaseBuilderAgent", "task_dependency_agent"}
+
+
+class TasksUnavailable(Exception):
+    """Raised when the task list cannot be fetched and no snapshot exists."""
+
+
+class TasksSnapshot:
+    """One copy of the task list with its validators."""
+
+    def __init__(self, body: Dict[str, Any], upstream_etag: Optional[str]):
+        self.body = body
+        self.upstream_etag = upstream_etag
+        raw = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+        self.etag = '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+        self.fetched_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+def _normalize(data: Any) -> Dict[str, Any]:
+    tasks = data.get("tasks") if isinstance(data, dict) else data
+    if not isinstance(tasks, list):
+        tasks = []
+    return {"tasks": tasks, "count": len(tasks), "status": data.get("status") if isinstance(data, dict) else None}
+
+
+class TasksProxy:
+    """Snapshot of the upstream task list with stale-while-revalidate refreshes."""
+
+    def __init__(
+        self,
+        url: str = TASKS_URL,
+        ttl_seconds: float = TASKS_CACHE_TTL_SECONDS,
+        stale_seconds: float = TASKS_STALE_SECONDS,
+    ):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = max(stale_seconds, ttl_seconds)
+        self._snapshot: Optional[TasksSnapshot] = None
+        self._refresh: Optional[asyncio.Task] = None
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Set when tasks changed while a refresh was already in flight.
+        self._stale_on_arrival = False
+
+    def _get_client(self):
+        # The connection pool is bound to the loop it was created on.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                self._track(asyncio.ensure_future(self._close_client(self._client)))
+            self._client = httpx.AsyncClient(timeout=TASKS_FETCH_TIMEOUT_SECONDS)
+            self._loop = loop
+        return self._client
+
+    @staticmethod
+    async def _close_client(client) -> None:
+        try:
+            await client.aclose()
+        except Exception as exc:
+            # Its connections may belong to a loop that is already closed.
+            logger.debug("Closing previous tasks client failed: %s", exc)
+
+    async def get(self) -> TasksSnapshot:
+        """Current snapshot; waits on upstream only when nothing usable is cached."""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age() < self.ttl_seconds:
+            metrics.incr("tasks_cache_fresh")
+            return snapshot
+        if snapshot is not None and snapshot.age() < self.stale_seconds:
+            metrics.incr("tasks_cache_stale")
+            self._start_refresh()
+            return snapshot
+        metrics.incr("tasks_cache_miss")
+        return await asyncio.shield(self._start_refresh())
+
+    def invalidate(self) -> None:
+        """Mark the snapshot stale; the next ``get`` serves it and revalidates."""
+        self._mark_stale(self._snapshot)
+        metrics.incr("tasks_cache_invalidations")
+        if self._refresh is not None and not self._refresh.done():
+            # The request in flight may predate the write: its result is stale too.
+            self._stale_on_arrival = True
+
+    def _mark_stale(self, snapshot: Optional[TasksSnapshot]) -> None:
+        if snapshot is not None:
+            snapshot.fetched_at = min(snapshot.fetched_at, time.monotonic() - self.ttl_seconds)
+
+    def invalidate_for(self, agent_name: str) -> None:
+        """Invalidate after a successful run of an agent that writes tasks."""
+        if agent_name in TASK_WRITER_AGENTS:
+            self.invalidate()
+
+    def _start_refresh(self) -> "asyncio.Task":
+        """Single-flight refresh: concurrent callers share one upstream request."""
+        loop = asyncio.get_running_loop()
+        if self._refresh is None or self._refresh.done() or self._refresh.get_loop() is not loop:
+            task = asyncio.ensure_future(self._fetch())
+            self._track(task)
+            task.add_done_callback(self._refresh_done)
+            self._refresh = task
+        return self._refresh
+
+    def _track(self, task: "asyncio.Task") -> None:
+        # Hold a reference until the task finishes.
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _refresh_done(self, task: "asyncio.Task") -> None:
+        # Retrieve errors nobody waited for.
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Tasks refresh failed: %s", task.exception())
+        if self._stale_on_arrival and task is self._refresh:
+            self._stale_on_arrival = False
+            self._mark_stale(self._snapshot)
+
+    async def _fetch(self) -> TasksSnapshot:
+        if httpx is None:
+            raise TasksUnavailable("httpx not installed to fetch tasks")
+        previous = self._snapshot
+        headers = {"If-None-Match": previous.upstream_etag} if previous and previous.upstream_etag else {}
+        started = time.perf_counter()
+        metrics.incr("tasks_upstream_requests")
+        try:
+            resp = await self._get_client().get(self.url, headers=headers)
+            if resp.status_code == 304 and previous is not None:
+                metrics.incr("tasks_upstream_not_modified")
+                previous.fetched_at = time.monotonic()
+                return previous
+            resp.raise_for_status()
+            snapshot = TasksSnapshot(_normalize(resp.json()), resp.headers.get("etag"))
+        except Exception as exc:
+            metrics.incr("tasks_upstream_errors")
+            if previous is not None:
+                # Keep serving what we have; the next stale read retries.
+                logger.warning("Tasks refresh failed, serving cached list: %s", exc)
+                return previous
+            raise TasksUnavailable(f"Failed to fetch tasks from knowledge base: {exc}") from exc
+        finally:
+            metrics.observe("tasks_upstream_latency_ms", (time.perf_counter() - started) * 1000)
+        self._snapshot = snapshot
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "url": self.url,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "cached": snapshot is not None,
+            "age_seconds": round(snapshot.age(), 3) if snapshot else None,
+            "count": snapshot.body["count"] if snapshot else 0,
+            "upstream_requests": metrics.get_counter("tasks_upstream_requests"),
+            "not_modified": metrics.get_counter("tasks_upstream_not_modified"),
+        }
+
+
+tasks_proxy = TasksProxy()
@@ -0,0 +1,88 @@
+"""
+Thread-safe LRU + TTL map shared by the in-memory stores (plan cache, answer
+cache, result store, idempotency replays). Entries expire ``ttl_seconds``
+after they were stored and the least recently used entry is evicted once
+``max_entries`` is exceeded. A cache with a ``name`` counts lookups as
+``<name>_hits``/``<name>_misses`` in metrics.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+from . import metrics
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """LRU + TTL map; a size or TTL of 0 disables it."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, name: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: K) -> Optional[V]:
+        """The live value for ``key`` (marking it recently used), or None."""
+        if not self.enabled:
+            return None
+        value: Optional[V] = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] < time.monotonic():
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    value = entry[1]
+        if self.name:
+            metrics.incr(f"{self.name}_hits" if value is not None else f"{self.name}_misses")
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def flush(self) -> int:
+        """Drop every entry; returns how many were removed."""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+        return count
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        report: Dict[str, float] = {
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+        if self.name:
+            hits = metrics.get_counter(f"{self.name}_hits")
+            misses = metrics.get_counter(f"{self.name}_misses")
+            report.update(
+                {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                }
+            )
+        return report
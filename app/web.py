@@ -388,6 +388,7 @@ STYLES = """
           .dot { width: 10px; height: 10px; border-radius: 50%; }
           .dot.success { background: var(--success); box-shadow: 0 0 12px rgba(34,197,94,0.35); }
           .dot.error { background: var(--error); box-shadow: 0 0 12px rgba(239,68,68,0.35); }
+          .dot.scheduled, .dot.pending { background: var(--accent); box-shadow: 0 0 12px rgba(34,211,238,0.35); }
           .mono { font-family: ui-monospace, SFMono-Regular, Menlo, monospace; font-size: 13px; }
           .json-box {
             background: #0d1524; padding: 10px; border-radius: 10px;
@@ -413,7 +414,7 @@ COMMON_REACT = """
 
           const TimelineItem = ({ item, index }) => (
             <div className="timeline-item">
-              <span className={`dot ${item.status === 'success' ? 'success' : 'error'}`}></span>
+              <span className={`dot ${['success', 'scheduled', 'pending'].includes(item.status) ? item.status : 'error'}`}></span>
               <div>
                 <div style={{ display: 'flex', gap: 8, alignItems: 'center' }}>
                   <strong>{item.name}</strong>
@@ -501,19 +502,22 @@ def render_home() -> HTMLResponse:
             const [agents, setAgents] = useState([]);
             const [usedAgents, setUsedAgents] = useState([]);
             const [intermediate, setIntermediate] = useState({});
+            const [requestId, setRequestId] = useState(null);
             const [status, setStatus] = useState('');
             const [error, setError] = useState(null);
             const [openIntermediate, setOpenIntermediate] = useState(false);
             const [fileName, setFileName] = useState('');
             const [uploadedFiles, setUploadedFiles] = useState([]);
+            const [draft, setDraft] = useState('');
             const chatRef = React.useRef(null);
             const fileInputRef = React.useRef(null);
+            const abortRef = React.useRef(null);
 
             useEffect(() => {
               if (chatRef.current) {
                 chatRef.current.scrollTop = chatRef.current.scrollHeight;
               }
-            }, [messages, status]);
+            }, [messages, status, draft]);
 
             const renderMarkdown = (text) => {
               if (!text || typeof text !== 'string') return text;
@@ -533,7 +537,26 @@ def render_home() -> HTMLResponse:
               window.localStorage.setItem('conversationId', initialConv);
             }, []);
 
+            // Late results from slow agents arrive as follow-ups; append them when ready.
+            const followLateResults = (ids) => {
+              (ids || []).forEach((id) => {
+                const source = new EventSource(`/api/followups/${id}/events`);
+                source.addEventListener('result', (e) => {
+                  const info = JSON.parse(e.data);
+                  if (info.answer) {
+                    setMessages((prev) => [...prev, { role: 'assistant', content: info.answer }]);
+                  }
+                  source.close();
+                });
+                source.onerror = () => source.close();
+              });
+            };
+
             const resetConversation = () => {
+              // Abort any in-flight request so the server cancels its agent calls.
+              if (abortRef.current) abortRef.current.abort();
+              setStatus('');
+              setDraft('');
               const next = crypto.randomUUID ? crypto.randomUUID() : String(Date.now());
               setConversationId(next);
               window.localStorage.setItem('conversationId', next);
@@ -550,13 +573,35 @@ def render_home() -> HTMLResponse:
               const userMsg = { role: 'user', content: input };
               setMessages((prev) => [...prev, userMsg]);
               setInput('');
-              setStatus('Working...');
+              setStatus('Working on your request...');
               setError(null);
               setUsedAgents([]);
               setIntermediate({});
+              setDraft('');
 
               const fileUploads = [...uploadedFiles];
 
+              // Apply one server-sent event from /api/query/stream to the UI.
+              let answerDraft = '';
+              let data = null;
+              const applyEvent = (evt, payload) => {
+                if (evt === 'plan') {
+                  setStatus(payload.steps.length ? `Planned ${payload.steps.length} agent call(s)...` : 'Composing answer...');
+                } else if (evt === 'step_started') {
+                  setStatus(`Calling ${payload.agent}...`);
+                } else if (evt === 'step_finished') {
+                  setUsedAgents((prev) => [...prev, { name: payload.agent, intent: payload.intent, status: payload.status }]);
+                  setStatus(`${payload.agent} finished in ${Math.round(payload.latency_ms)} ms`);
+                } else if (evt === 'answer_delta') {
+                  answerDraft += payload.text;
+                  setDraft(answerDraft);
+                } else if (evt === 'done') {
+                  data = payload;
+                } else if (evt === 'error') {
+                  data = { answer: 'Sorry, something went wrong while answering.', error: payload };
+                }
+              };
+
               try {
                 const requestBody = {
                   query: userMsg.content,
@@ -569,26 +614,65 @@ def render_home() -> HTMLResponse:
                   requestBody.file_uploads = fileUploads;
                 }
 
-                const resp = await fetch('/api/query', {
+                const controller = new AbortController();
+                abortRef.current = controller;
+                const resp = await fetch('/api/query/stream', {
                   method: 'POST',
                   headers: { 'Content-Type': 'application/json' },
-                  body: JSON.stringify(requestBody)
+                  body: JSON.stringify(requestBody),
+                  signal: controller.signal
                 });
-                const data = await resp.json();
+                if (!resp.ok || !resp.body) throw new Error(`HTTP ${resp.status}`);
+                const reader = resp.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                while (true) {
+                  const { value, done } = await reader.read();
+                  if (done) break;
+                  buffer += decoder.decode(value, { stream: true });
+                  let sep;
+                  while ((sep = buffer.indexOf('\\n\\n')) >= 0) {
+                    const frame = buffer.slice(0, sep).split('\\n');
+                    buffer = buffer.slice(sep + 2);
+                    const eventLine = frame.find((l) => l.startsWith('event: '));
+                    const dataLine = frame.find((l) => l.startsWith('data: '));
+                    if (eventLine && dataLine) applyEvent(eventLine.slice(7), JSON.parse(dataLine.slice(6)));
+                  }
+                }
+                if (!data) throw new Error('Stream ended without a result');
                 setStatus('');
+                setDraft('');
                 setUsedAgents(data.used_agents || []);
                 setIntermediate(data.intermediate_results || {});
+                setRequestId(data.request_id || null);
                 setError(data.error);
                 setMessages((prev) => [...prev, { role: 'assistant', content: data.answer || 'No answer produced.' }]);
+                followLateResults(data.followup_ids);
                 setUploadedFiles([]);
                 setFileName('');
               } catch (err) {
+                if (err.name === 'AbortError') return;
                 setStatus('');
+                setDraft('');
                 setError({ message: 'Network error', type: 'network_error' });
                 setMessages((prev) => [...prev, { role: 'assistant', content: 'Sorry, I could not reach the server.' }]);
               }
             };
 
+            // Responses carry step payloads only when debug was on at send time;
+            // otherwise fetch them from the server-side result store.
+            const toggleIntermediate = async () => {
+              const opening = !openIntermediate;
+              setOpenIntermediate(opening);
+              if (!opening || !requestId || Object.keys(intermediate).length > 0) return;
+              try {
+                const resp = await fetch(`/api/requests/${requestId}`);
+                if (resp.ok) setIntermediate((await resp.json()).intermediate_results || {});
+              } catch (err) {
+                // Leave the panel empty; the result may have expired.
+              }
+            };
+
             const handleFileUpload = (e) => {
               const file = e.target.files[0];
               if (!file) return;
@@ -681,6 +765,7 @@ Summarize the attached document`);
                       <span className="slider"></span>
                       <span>Show debug</span>
                     </label>
+                    <button type="button" className="file-trigger" onClick={resetConversation}>New chat</button>
                   </div>
 
                   <div className="chat-feed" id="chat-feed" ref={chatRef}>
@@ -690,9 +775,15 @@ Summarize the attached document`);
                         {m.role === 'assistant' ? renderMarkdown(m.content) : m.content}
                       </div>
                     ))}
-                    {status && (
+                    {draft && (
+                      <div className="msg assistant">
+                        <strong style={{ display: 'block', marginBottom: 6, color: '#cbd5e1' }}>Supervisor</strong>
+                        {renderMarkdown(draft)}
+                      </div>
+                    )}
+                    {status && !draft && (
                       <div className="msg assistant" style={{ display: 'inline-flex', alignItems: 'center', gap: 8 }}>
-                        <span className="status-dot"></span> Working on your request...
+                        <span className="status-dot"></span> {status}
                       </div>
                     )}
                   </div>
@@ -732,7 +823,7 @@ Summarize the attached document`);
                           <label className="section-title" style={{ margin: 0 }}>Intermediate results</label>
                         </div>
                         <div style={{ marginTop: 8 }}>
-                          <button className="primary" style={{ padding: '8px 12px', fontWeight: 600 }} onClick={() => setOpenIntermediate(v => !v)}>
+                          <button className="primary" style={{ padding: '8px 12px', fontWeight: 600 }} onClick={toggleIntermediate}>
                             {openIntermediate ? 'Hide payload' : 'Show payload'}
                           </button>
                         </div>
@@ -810,8 +901,9 @@ def render_tasks_page() -> HTMLResponse:
             const [status, setStatus] = useState('Loading tasks...');
             const [error, setError] = useState(null);
             const [sortBy, setSortBy] = useState('execution_order');
+            const [followup, setFollowup] = useState(null);
 
-            useEffect(() => {
+            const loadTasks = () => {
               fetch('/api/tasks')
                 .then(async (resp) => {
                   if (!resp.ok) {
@@ -836,6 +928,25 @@ def render_tasks_page() -> HTMLResponse:
                   setError(err.message);
                   setStatus('');
                 });
+            };
+
+            useEffect(loadTasks, []);
+
+            // Track the latest background dependency resolution; reload tasks when it completes.
+            useEffect(() => {
+              let lastStatus = null;
+              const poll = () => fetch('/api/followups?limit=1&intent=task.resolve_dependencies')
+                .then((r) => r.json())
+                .then((runs) => {
+                  const latest = Array.isArray(runs) && runs.length ? runs[0] : null;
+                  setFollowup(latest);
+                  if (latest && lastStatus && lastStatus !== latest.status && latest.status === 'done') loadTasks();
+                  lastStatus = latest ? latest.status : null;
+                })
+                .catch(() => {});
+              poll();
+              const timer = setInterval(poll, 5000);
+              return () => clearInterval(timer);
             }, []);
 
             const sortedTasks = React.useMemo(() => {
@@ -886,6 +997,11 @@ def render_tasks_page() -> HTMLResponse:
                   </select>
                   {status && <span className="small">{status}</span>}
                   {error && <span className="small" style={{ color: '#f87171' }}>Error: {error}</span>}
+                  {followup && (
+                    <span className="status-pill">
+                      Dependency analysis: {followup.status}{followup.triggers > 1 ? ` (${followup.triggers} triggers)` : ''}
+                    </span>
+                  )}
                 </div>
 
                 {!status && !error && tasks.length === 0 && (
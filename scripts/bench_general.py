@@ -0,0 +1,49 @@
+"""
+Per-query cost of the general-query pre-routing stage (handle_general_query),
+which runs on every request before planning.
+
+    python scripts/bench_general.py [iterations]
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.general import handle_general_query  # noqa: E402
+
+QUERIES = [
+    # Misses: the common case, every rule is evaluated.
+    "Create a task to migrate the billing database by Friday",
+    "Summarize the attached quarterly report and list the key risks",
+    "How much budget is left for project Apollo and are we at risk of overspending?",
+    "Extract action items from yesterday's sprint planning transcript " * 4,
+    # Hits.
+    "hello there",
+    "how are you doing?",
+    "what's the date today",
+    "what time is it now",
+    "you are stupid",
+]
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for query in QUERIES:
+        handle_general_query(query)  # warm up
+    total = 0.0
+    for query in QUERIES:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            handle_general_query(query)
+        elapsed = (time.perf_counter() - started) / iterations * 1e6
+        total += elapsed
+        kind = handle_general_query(query)["kind"]
+        print(f"{elapsed:8.2f} us  {kind:8s} {query[:60]!r}")
+    print(f"{total / len(QUERIES):8.2f} us  mean per query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Local OpenAI-compatible completion server for benchmarks and offline testing.
+
+Run it, then point the supervisor at it:
+
+    uvicorn scripts.fake_llm_server:app --port 8900
+    LLM_BASE_URL=http://127.0.0.1:8900/v1 OPENROUTER_API_KEY=fake uvicorn main:app
+
+Planner requests get an empty plan (out of scope) unless the query names a
+registry agent; every other request gets a short canned answer. Latency and
+failure rate are configurable to exercise the gateway's limits and retries.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_LLM_LATENCY_MS = int(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+app = FastAPI(title="Fake LLM")
+
+
+def _reply(messages) -> str:
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    if system.startswith("You are a planner"):
+        query = json.loads(user).get("user_query", "")
+        # Route to any agent the query names, e.g. "ask deadline_guardian_agent".
+        for line in system.splitlines():
+            if line.startswith("- ") and line[2:].split(" ", 1)[0] in query:
+                name, rest = line[2:].split(" ", 1)
+                intent = rest[1:rest.index("]")].split(",")[0].strip()
+                step = {"step_id": 0, "agent": name, "intent": intent, "input_source": "user_query"}
+                return json.dumps({"steps": [step]})
+        return json.dumps({"steps": []})
+    return "Here is a concise answer based on the tool outputs."
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    await asyncio.sleep(FAKE_LLM_LATENCY_MS / 1000)
+    if random.random() < FAKE_LLM_ERROR_RATE:
+        return JSONResponse({"error": {"message": "fake overload"}}, status_code=503)
+
+    content = _reply(body.get("messages", []))
+    prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if body.get("stream"):
+        async def chunks():
+            for word in content.split(" "):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0.01)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        },
+    }
@@ -0,0 +1,66 @@
+"""Admission lanes: slots are never lost to a timeout race or an early client disconnect."""
+import asyncio
+
+import pytest
+
+from app import admission as admission_module
+from app import server
+from app.admission import AdmissionController, AdmissionRejected
+
+
+def test_slot_handed_over_at_timeout_is_passed_on(monkeypatch):
+    controller = AdmissionController(enabled=True, max_inflight=1, max_queue=1, queue_timeout_ms=10)
+
+    async def run():
+        await controller.acquire("default")
+        lane = controller._lane("default")
+
+        async def wait_for(waiter, timeout):
+            # The holder releases exactly as the waiter's timeout fires.
+            controller.release("default")
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(admission_module.asyncio, "wait_for", wait_for)
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("default")
+        return lane.inflight
+
+    assert asyncio.run(run()) == 0
+
+
+def test_stream_releases_slot_when_client_leaves_before_body(monkeypatch):
+    controller = AdmissionController(enabled=True, max_inflight=1)
+    monkeypatch.setattr(server, "admission", controller)
+    body_started = []
+
+    async def body():
+        body_started.append(True)
+        yield "data\n"
+
+    async def send(message):
+        raise OSError("client went away")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def run():
+        await controller.acquire("default")
+        response = server._AdmittedStream(body(), "default", media_type="text/event-stream")
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        with pytest.raises(Exception):
+            await response(scope, receive, send)
+        return controller.inflight()
+
+    assert asyncio.run(run()) == 0
+    assert body_started == []
+
+
+def test_batch_lane_sheds_when_full():
+    controller = AdmissionController(enabled=True, batch_max_inflight=1, batch_max_queue=0)
+
+    async def run():
+        await controller.acquire("batch")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("batch")
+
+    asyncio.run(run())
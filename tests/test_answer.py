@@ -0,0 +1,20 @@
+"""Template answers render the result only, never the agent's raw details payload."""
+import json
+
+from app.answer import direct_answer
+from app.models import AgentResponse, OutputModel, Plan, PlanStep
+from app.registry import load_registry
+
+
+def test_template_answer_omits_raw_details():
+    raw = {"success": True, "projects": [{"name": "Apollo", "spent": 10}]}
+    response = AgentResponse(
+        request_id="r",
+        agent_name="budget_tracker_agent",
+        status="success",
+        output=OutputModel(result={"projects": raw["projects"]}, details=json.dumps(raw, indent=2)),
+    )
+    plan = Plan(steps=[PlanStep(step_id=1, agent="budget_tracker_agent", intent="budget.list", input_source="user_query")])
+    answer = direct_answer(plan, {1: response}, load_registry())
+    assert answer is not None and "Apollo" in answer
+    assert "{" not in answer and '"success"' not in answer
@@ -0,0 +1,44 @@
+"""Each distinct LLM plan in a batch costs one token; items over the limit read as rate_limited."""
+import asyncio
+
+from app import batch, pipeline
+from app.models import FrontendRequest, Plan
+from app.rate_limit import RateLimiter
+
+
+def _run(monkeypatch, limiter, texts):
+    async def llm_plan(query, registry, history, deadline=None):
+        return Plan(steps=[])
+
+    monkeypatch.setattr(pipeline, "heuristic_plan", lambda query: None)
+    monkeypatch.setattr(pipeline, "llm_plan", llm_plan)
+    monkeypatch.setattr(pipeline.plan_cache, "get", lambda *args, **kwargs: None)
+    monkeypatch.setattr(pipeline.learned_router, "route", lambda *args, **kwargs: None)
+    monkeypatch.setattr(pipeline, "rate_limiter", limiter)
+    monkeypatch.setattr(batch.intent_classifier, "classify_many", lambda texts, registry: [None] * len(texts))
+    queries = [FrontendRequest(query=text, user_id="bob") for text in texts]
+
+    async def collect():
+        return [item async for item in batch.run_batch(queries)]
+
+    return asyncio.run(collect())
+
+
+def test_batch_charges_one_token_per_distinct_plan(monkeypatch):
+    limiter = RateLimiter(enabled=True)
+    limiter.buckets["llm"] = (1 / 60, 3)
+    texts = [f"summarize report number {i % 2}" for i in range(10)]
+    items = _run(monkeypatch, limiter, texts)
+    assert len(items) == 10
+    assert all(item.error is None for item in items)
+    # Two distinct plans took two tokens; one is left.
+    asyncio.run(limiter.check("llm", "user:bob"))
+
+
+def test_items_over_the_llm_limit_are_rate_limited(monkeypatch):
+    limiter = RateLimiter(enabled=True)
+    limiter.buckets["llm"] = (1 / 60, 5)
+    items = _run(monkeypatch, limiter, [f"summarize report number {i}" for i in range(30)])
+    errors = [item.error.type for item in items if item.error is not None]
+    assert len(items) == 30
+    assert errors == ["rate_limited"] * 25
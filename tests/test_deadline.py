@@ -0,0 +1,40 @@
+"""The request deadline may cut off read-only calls but never a started write."""
+import asyncio
+
+from app import deadline, executor
+from app.deadline import Deadline
+from app.models import AgentResponse, Plan, PlanStep
+from app.registry import load_registry
+
+
+def test_deadline_disabled_by_default():
+    assert deadline.REQUEST_DEADLINE_MS == 0
+
+
+def _run(monkeypatch, intent):
+    seen = {}
+
+    async def call_agent(agent_meta, intent, text, context, deadline=None):
+        seen["deadline"] = deadline
+        await asyncio.sleep(0.2)
+        return AgentResponse(request_id="r", agent_name=agent_meta.name, status="success")
+
+    monkeypatch.setattr(executor, "call_agent", call_agent)
+    plan = Plan(steps=[PlanStep(step_id=1, agent="onboarding_buddy_agent", intent=intent, input_source="user_query")])
+
+    async def run():
+        outputs, _ = await executor.execute_plan("q", plan, load_registry(), {}, deadline=Deadline(50))
+        return outputs[1]
+
+    return asyncio.run(run()), seen
+
+
+def test_started_write_intent_is_not_cancelled(monkeypatch):
+    response, seen = _run(monkeypatch, "onboarding.create")
+    assert response.status == "success"
+    assert seen["deadline"] is None
+
+
+def test_read_only_intent_is_cancelled(monkeypatch):
+    response, _ = _run(monkeypatch, "onboarding.check_progress")
+    assert response.error.type == "deadline_exceeded"
@@ -0,0 +1,33 @@
+"""A client that goes away cancels its whole run."""
+import asyncio
+
+import pytest
+
+from app import pipeline
+from app.models import FrontendRequest
+
+
+def test_disconnect_cancels_the_run(monkeypatch):
+    log = []
+
+    async def run_query(payload):
+        log.append("started")
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            log.append("cancelled")
+            raise
+
+    async def disconnected():
+        return True
+
+    monkeypatch.setattr(pipeline, "run_query", run_query)
+    monkeypatch.setattr(pipeline, "DISCONNECT_POLL_SECONDS", 0.01)
+
+    async def run():
+        with pytest.raises(pipeline.ClientDisconnected):
+            await pipeline.run_until_disconnected(FrontendRequest(query="status"), disconnected)
+        await asyncio.sleep(0)
+        return list(log)
+
+    assert asyncio.run(run()) == ["started", "cancelled"]
@@ -0,0 +1,34 @@
+"""Coalesced follow-ups: a run cancelled while pending must not swallow later triggers."""
+import asyncio
+
+from app import followups
+from app.followups import FollowupManager
+from app.models import AgentResponse
+from app.registry import load_registry
+
+
+def test_cancelled_pending_run_does_not_capture_new_triggers(monkeypatch):
+    calls = []
+
+    async def call_agent(agent_meta, intent, text, context, custom_input=None):
+        calls.append(intent)
+        return AgentResponse(request_id="r", agent_name=agent_meta.name, status="success")
+
+    monkeypatch.setattr(followups, "call_agent", call_agent)
+    manager = FollowupManager(coalesce_seconds=0.05)
+
+    async def run():
+        registry = load_registry()
+        first = manager.schedule_dependency_resolution(registry, {"conversation_id": "c1"})
+        await asyncio.sleep(0)
+        for task in list(manager._tasks):
+            task.cancel()
+        await asyncio.sleep(0.01)
+        second = manager.schedule_dependency_resolution(registry, {"conversation_id": "c2"})
+        await asyncio.sleep(0.1)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.status == "error" and first.finished_at is not None
+    assert second is not first and second.status == "done"
+    assert len(calls) == 1
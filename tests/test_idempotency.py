@@ -0,0 +1,78 @@
+"""Idempotency-Key: one run per key, replays within the TTL, conflicts on a different body."""
+import asyncio
+
+import pytest
+
+from app.idempotency import IdempotencyConflict, IdempotencyStore
+from app.models import FrontendRequest, SupervisorResponse
+
+
+async def _connected():
+    return False
+
+
+def _runner(calls, delay=0.0):
+    async def run():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return SupervisorResponse(answer=f"run {len(calls)}", used_agents=[])
+
+    return run
+
+
+def test_completed_run_is_replayed():
+    store, calls = IdempotencyStore(), []
+    payload = FrontendRequest(query="create a task")
+
+    async def run():
+        first = await store.execute("k", payload, _runner(calls), _connected)
+        second = await store.execute("k", payload, _runner(calls), _connected)
+        return first, second
+
+    (first, replayed_first), (second, replayed_second) = asyncio.run(run())
+    assert (replayed_first, replayed_second) == (False, True)
+    assert second.answer == first.answer and len(calls) == 1
+
+
+def test_concurrent_duplicate_attaches_to_the_running_task():
+    store, calls = IdempotencyStore(), []
+    payload = FrontendRequest(query="create a task")
+
+    async def run():
+        return await asyncio.gather(
+            store.execute("k", payload, _runner(calls, 0.05), _connected),
+            store.execute("k", payload, _runner(calls, 0.05), _connected),
+        )
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in results) == [False, True]
+
+
+def test_reused_key_with_different_body_conflicts():
+    store, calls = IdempotencyStore(), []
+
+    async def run():
+        await store.execute("k", FrontendRequest(query="create a task"), _runner(calls), _connected)
+        await store.execute("k", FrontendRequest(query="delete a task"), _runner(calls), _connected)
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_failed_run_is_not_stored():
+    store, calls = IdempotencyStore(), []
+    payload = FrontendRequest(query="create a task")
+
+    async def failing():
+        calls.append(1)
+        raise RuntimeError("agent down")
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await store.execute("k", payload, failing, _connected)
+        return await store.execute("k", payload, _runner(calls), _connected)
+
+    _, replayed = asyncio.run(run())
+    assert replayed is False and len(calls) == 2
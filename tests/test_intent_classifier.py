@@ -0,0 +1,41 @@
+"""The local intent classifier must never route a query to an intent that writes data."""
+import pytest
+
+from app.intent_classifier import IntentClassifier
+from app.registry import load_registry
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return IntentClassifier(enabled=True)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "delete the task about slides",
+        "list all my tasks",
+        "create an account for bob",
+        "remind me to write the quarterly report by friday",
+        "set up accounts for our new engineer",
+    ],
+)
+def test_write_intents_defer_to_llm(classifier, query):
+    assert classifier.classify(query, load_registry()) is None
+
+
+def test_only_read_only_intents_are_routed(classifier):
+    registry = load_registry()
+    read_only = {(agent.name, intent) for agent in registry for intent in agent.read_only_intents}
+    queries = [
+        "how much money is left for marketing",
+        "which deliverables are running late",
+        "is this email urgent",
+        "give me a short overview of this document",
+        "how productive was I last week",
+    ]
+    plans = classifier.classify_many(queries, registry)
+    assert all(plan is not None for plan in plans)
+    for plan in plans:
+        step = plan.steps[0]
+        assert (step.agent, step.intent) in read_only
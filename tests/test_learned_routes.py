@@ -0,0 +1,50 @@
+"""Learned routing rules must not send queries to write intents on their own."""
+from app.learned_routes import LearnedRouter
+from app.models import Plan, PlanStep
+from app.registry import load_registry
+
+
+def _plan(agent, intent):
+    return Plan(steps=[PlanStep(step_id=0, agent=agent, intent=intent, input_source="user_query")])
+
+
+def _train(router, registry, queries, agent, intent):
+    for query in queries:
+        router.observe(query, _plan(agent, intent), registry)
+    router.promote()
+
+
+ADD_TASK_QUERIES = [
+    "add a task to write docs",
+    "add a task to prepare slides",
+    "add a task to migrate the database",
+    "add a task to email the client",
+    "add a task to review the budget",
+]
+
+
+def test_rules_need_review_by_default():
+    registry = load_registry()
+    router = LearnedRouter(promote_seconds=3600)
+    _train(router, registry, ADD_TASK_QUERIES, "KnowledgeBaseBuilderAgent", "create_task")
+    assert {rule["status"] for rule in router.export()["rules"]} == {"proposed"}
+    assert router.route("add a task to call bob", registry) is None
+
+
+def test_write_intents_never_auto_activate():
+    registry = load_registry()
+    router = LearnedRouter(require_review=False, promote_seconds=3600)
+    _train(router, registry, ADD_TASK_QUERIES, "KnowledgeBaseBuilderAgent", "create_task")
+    assert all(rule["status"] == "proposed" for rule in router.export()["rules"])
+    for query in ["delete the task about slides", "is my task done", "add a task to call bob"]:
+        assert router.route(query, registry) is None
+
+
+def test_single_unigram_does_not_route():
+    registry = load_registry()
+    router = LearnedRouter(require_review=False, promote_seconds=3600)
+    queries = [f"show the budget report for project {name}" for name in ["apollo", "gemini", "mercury", "atlas", "zeus"]]
+    _train(router, registry, queries, "budget_tracker_agent", "budget.report")
+    assert router.route("budget report for project hermes", registry) is not None
+    # Only the unigram "budget" matches; a single common word is not enough.
+    assert router.route("delete the budget", registry) is None
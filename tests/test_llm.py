@@ -0,0 +1,54 @@
+"""LLM calls without a deadline still get a timeout, and never an explicit None."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import llm
+from app.llm import LLMBackend, LLMGateway, LLMResult, OpenAICompatibleBackend
+
+
+class _RecordingBackend(LLMBackend):
+    def __init__(self):
+        self.timeouts = []
+
+    async def complete(self, model, messages, timeout, **kwargs):
+        self.timeouts.append(timeout)
+        return LLMResult(content="ok")
+
+    async def stream(self, model, messages, timeout):
+        self.timeouts.append(timeout)
+        yield "ok"
+
+
+def test_gateway_caps_calls_without_deadline():
+    backend = _RecordingBackend()
+    asyncio.run(LLMGateway(backend).complete("summary", "m", []))
+    assert backend.timeouts == [llm.LLM_DEFAULT_TIMEOUT_SECONDS]
+
+
+def test_backend_must_implement_both_calls():
+    class CompleteOnly(LLMBackend):
+        async def complete(self, model, messages, timeout, **kwargs):
+            return LLMResult(content="ok")
+
+    with pytest.raises(TypeError):
+        CompleteOnly()
+
+
+def test_backend_omits_none_timeout():
+    seen = {}
+
+    async def create(**kwargs):
+        seen.update(kwargs)
+        return SimpleNamespace(choices=[], usage=None)
+
+    backend = OpenAICompatibleBackend(api_key="k")
+
+    async def run():
+        backend._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        backend._loop = asyncio.get_running_loop()
+        await backend.complete("m", [], None)
+
+    asyncio.run(run())
+    assert "timeout" not in seen
@@ -0,0 +1,26 @@
+"""Tool-output reduction must not drop data fields the user may be asking about."""
+from app.models import AgentResponse, OutputModel
+from app.output_reduction import reduce_tool_outputs
+
+
+def _response(result):
+    return AgentResponse(request_id="r", agent_name="a", status="success", output=OutputModel(result=result))
+
+
+def test_small_output_passes_through_untouched():
+    result = {"tasks": [{"title": "Write docs", "status": "blocked"}], "project": {"status": "over_budget"}}
+    findings, report = reduce_tool_outputs("what is blocked?", {0: _response(result)})
+    assert findings[0]["result"] == result
+    assert report == []
+
+
+def test_large_output_keeps_nested_status():
+    result = {
+        "request_id": "r1",
+        "status": "ok",
+        "tasks": [{"title": f"task {i}", "status": "blocked", "note": ""} for i in range(300)],
+    }
+    findings, _ = reduce_tool_outputs("what is blocked?", {0: _response(result)}, budget_tokens=500)
+    reduced = findings[0]["result"]
+    assert "request_id" not in reduced and "status" not in reduced
+    assert reduced["tasks"][0] == {"title": "task 0", "status": "blocked"}
@@ -0,0 +1,72 @@
+"""Rate-limit middleware: 429 with Retry-After, IP keys unless a trusted proxy vouches for the user."""
+import asyncio
+
+from app import rate_limit
+from app.rate_limit import RateLimiter, RateLimitMiddleware, SQLiteBucketStore, client_key
+
+
+def _limiter(burst=1):
+    limiter = RateLimiter(enabled=True)
+    limiter.buckets["request"] = (1 / 60, burst)
+    return limiter
+
+
+def _call(middleware, user="", ip="10.0.0.1", path="/api/query"):
+    sent, keys = [], []
+
+    async def app(scope, receive, send):
+        keys.append(client_key())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    middleware.app = app
+    headers = [(b"x-user-id", user.encode())] if user else []
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers, "client": (ip, 1234)}
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], dict(sent[0]["headers"]), keys
+
+
+def test_empty_bucket_returns_429_with_retry_after():
+    middleware = RateLimitMiddleware(None, limiter=_limiter())
+    assert _call(middleware)[0] == 200
+    status, headers, _ = _call(middleware)
+    assert status == 429
+    assert int(headers[b"retry-after"]) >= 1
+
+
+def test_rotating_user_header_does_not_reset_the_bucket():
+    middleware = RateLimitMiddleware(None, limiter=_limiter())
+    assert _call(middleware, user="a")[0] == 200
+    assert _call(middleware, user="b")[0] == 429
+
+
+def test_trusted_proxy_keys_on_user_header(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", {"10.0.0.9"})
+    middleware = RateLimitMiddleware(None, limiter=_limiter())
+    status, _, keys = _call(middleware, user="a", ip="10.0.0.9")
+    assert (status, keys) == (200, ["user:a"])
+    assert _call(middleware, user="b", ip="10.0.0.9")[0] == 200
+
+
+def test_jobs_runs_are_keyed():
+    _, _, keys = _call(RateLimitMiddleware(None, limiter=_limiter()), path="/api/jobs")
+    assert keys == ["ip:10.0.0.1"]
+
+
+def test_sqlite_store_runs_off_the_event_loop(tmp_path, monkeypatch):
+    limiter = RateLimiter(enabled=True, sqlite_path=str(tmp_path / "buckets.db"))
+    calls = []
+
+    async def to_thread(func, *args):
+        calls.append(func)
+        return func(*args)
+
+    monkeypatch.setattr(rate_limit.asyncio, "to_thread", to_thread)
+    asyncio.run(limiter.check("request", "ip:1"))
+    assert isinstance(limiter.store, SQLiteBucketStore) and len(calls) == 1
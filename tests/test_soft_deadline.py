@@ -0,0 +1,64 @@
+"""Soft-deadline execution: partial answers, the hard deadline still applies, no orphaned plans."""
+import asyncio
+
+from app import executor
+from app.deadline import Deadline
+from app.models import AgentResponse, Plan, PlanStep
+from app.registry import load_registry
+
+_PLAN = Plan(steps=[PlanStep(step_id=1, agent="onboarding_buddy_agent", intent="onboarding.check_progress", input_source="user_query")])
+
+
+def _slow_agent(monkeypatch, seconds, log):
+    async def call_agent(agent_meta, intent, text, context, deadline=None):
+        log.append("started")
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            log.append("cancelled")
+            raise
+        log.append("finished")
+        return AgentResponse(request_id="r", agent_name=agent_meta.name, status="success")
+
+    monkeypatch.setattr(executor, "call_agent", call_agent)
+
+
+def test_slow_step_is_pending_then_delivered(monkeypatch):
+    log = []
+    _slow_agent(monkeypatch, 0.1, log)
+
+    async def run():
+        outputs, _, late = await executor.execute_plan_soft("q", _PLAN, load_registry(), {}, 0.01)
+        assert outputs[1].status == "pending"
+        final, _ = await late
+        return final[1].status
+
+    assert asyncio.run(run()) == "success"
+
+
+def test_hard_deadline_applies_in_soft_mode(monkeypatch):
+    _slow_agent(monkeypatch, 0.5, [])
+
+    async def run():
+        outputs, _, late = await executor.execute_plan_soft(
+            "q", _PLAN, load_registry(), {}, 0.01, deadline=Deadline(50)
+        )
+        final, _ = await late
+        return final[1]
+
+    assert asyncio.run(run()).error.type == "deadline_exceeded"
+
+
+def test_cancelled_caller_cancels_the_plan(monkeypatch):
+    log = []
+    _slow_agent(monkeypatch, 0.5, log)
+
+    async def run():
+        caller = asyncio.ensure_future(executor.execute_plan_soft("q", _PLAN, load_registry(), {}, 1.0))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        await asyncio.sleep(0.05)
+        # Checked before asyncio.run cancels leftovers on shutdown.
+        return list(log)
+
+    assert asyncio.run(run()) == ["started", "cancelled"]
@@ -0,0 +1,62 @@
+"""Task writes only mark the snapshot stale; readers drive upstream fetches."""
+import asyncio
+
+from app.tasks_proxy import TasksProxy, TasksSnapshot
+
+
+def _proxy():
+    proxy = TasksProxy(url="http://upstream.invalid/tasks", ttl_seconds=60, stale_seconds=300)
+    proxy.fetches = 0
+
+    async def fetch():
+        proxy.fetches += 1
+        proxy._snapshot = TasksSnapshot({"tasks": [], "count": proxy.fetches, "status": None}, None)
+        return proxy._snapshot
+
+    proxy._fetch = fetch
+    return proxy
+
+
+def test_invalidate_without_readers_does_not_fetch():
+    proxy = _proxy()
+
+    async def run():
+        proxy.invalidate_for("KnowledgeBaseBuilderAgent")
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert proxy.fetches == 0
+
+
+def test_next_read_after_invalidate_revalidates():
+    proxy = _proxy()
+
+    async def run():
+        first = await proxy.get()
+        proxy.invalidate()
+        await asyncio.sleep(0)
+        assert proxy.fetches == 1
+        stale = await proxy.get()
+        await asyncio.sleep(0)
+        return first, stale, await proxy.get()
+
+    first, stale, fresh = asyncio.run(run())
+    assert stale is first
+    assert fresh.body["count"] == 2 and proxy.fetches == 2
+
+
+def test_client_from_previous_loop_is_closed():
+    proxy = TasksProxy()
+
+    async def client():
+        return proxy._get_client()
+
+    old = asyncio.run(client())
+
+    async def replace():
+        new = proxy._get_client()
+        await asyncio.sleep(0.01)
+        return new
+
+    assert asyncio.run(replace()) is not old
+    assert old.is_closed
@@ -0,0 +1,54 @@
+"""Decoded text uploads: truncation is visible to the agent and the text is sent once."""
+import asyncio
+import base64
+from types import SimpleNamespace
+
+from app import agent_caller, file_utils
+from app.file_utils import normalize_file_uploads
+from app.registry import find_agent_by_name, load_registry
+
+
+def _upload(text):
+    return {"base64_data": base64.b64encode(text.encode()).decode(), "filename": "notes.md", "mime_type": "text/markdown"}
+
+
+def _send(monkeypatch, uploads):
+    sent = {}
+
+    class Client:
+        def __init__(self, timeout=None):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def post(self, url, json=None):
+            sent.update(json)
+            return SimpleNamespace(status_code=500, text="", json=lambda: {})
+
+    monkeypatch.setattr(agent_caller, "httpx", SimpleNamespace(AsyncClient=Client))
+    agent = find_agent_by_name("document_summarizer_agent", load_registry())
+    asyncio.run(agent_caller.call_agent(agent, "summary.create", "summarize", {"file_uploads": uploads}))
+    return sent
+
+
+def test_truncated_upload_is_marked(monkeypatch):
+    monkeypatch.setattr(file_utils, "MAX_INLINE_TEXT_CHARS", 10)
+    _, uploads = normalize_file_uploads([_upload("0123456789abcdef")], "summarize")
+    assert uploads[0]["truncated"] is True
+    sent = _send(monkeypatch, uploads)
+    assert sent["input"]["text"].endswith("0123456789\n\n[truncated after 10 chars]")
+    assert sent["input"]["metadata"]["truncated"] is True
+
+
+def test_inlined_text_is_not_repeated_in_context(monkeypatch):
+    _, uploads = normalize_file_uploads([_upload("short document")], "summarize")
+    sent = _send(monkeypatch, uploads)
+    assert "short document" in sent["input"]["text"]
+    assert "text" not in sent["context"]["file_uploads"][0]
+    assert sent["context"]["file_uploads"][0]["filename"] == "notes.md"
+    # The caller's shared context still has the text for later steps.
+    assert uploads[0]["text"] == "short document"
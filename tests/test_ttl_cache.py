@@ -0,0 +1,29 @@
+"""The shared LRU + TTL map behind the plan/answer caches, result store and idempotency store."""
+import time
+
+from app.ttl_cache import TTLCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(2, 60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_entries_expire(monkeypatch):
+    cache = TTLCache(2, 10, name="ttl_cache_test")
+    cache.put("a", 1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats()["misses"] >= 1
+
+
+def test_zero_size_disables():
+    cache = TTLCache(0, 60)
+    cache.put("a", 1)
+    assert cache.get("a") is None and len(cache) == 0